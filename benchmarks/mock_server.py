@@ -0,0 +1,521 @@
+'''Local stand-in for api.spotify.com/v1 and accounts.spotify.com/api/token
+
+Serves a deterministic fake catalog for the endpoints used by pyotify, with
+injectable latency, 429 rate limiting with Retry-After, ETag revalidation
+and offset/cursor paging. Run it standalone with
+
+    python benchmarks/mock_server.py --port 8000 --latency 0.02
+
+or start it from code with MockSpotifyServer(...).start().
+'''
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MARKETS = ['AD', 'AE', 'AR', 'AT', 'AU', 'BE', 'BG', 'BO', 'BR', 'CA', 'CH', 'CL', 'CO', 'CR', 'CY', 'CZ', 'DE',
+           'DK', 'DO', 'EC', 'EE', 'ES', 'FI', 'FR', 'GB', 'GR', 'GT', 'HK', 'HN', 'HU', 'ID', 'IE', 'IL', 'IN',
+           'IS', 'IT', 'JP', 'LI', 'LT', 'LU', 'LV', 'MC', 'MT', 'MX', 'MY', 'NI', 'NL', 'NO', 'NZ', 'PA', 'PE',
+           'PH', 'PL', 'PT', 'PY', 'RO', 'SE', 'SG', 'SK', 'SV', 'TH', 'TR', 'TW', 'US', 'UY', 'VN', 'ZA']
+GENRES = ['acoustic', 'ambient', 'blues', 'classical', 'country', 'dance', 'electronic', 'folk', 'hip-hop',
+          'indie', 'jazz', 'metal', 'pop', 'punk', 'r-n-b', 'reggae', 'rock', 'soul', 'techno', 'world-music']
+PAGING_PARAMS = ('offset', 'limit', 'after', 'before')
+WORDS = ['love', 'night', 'blue', 'fire', 'heart', 'river', 'dream', 'light', 'road', 'summer', 'gold', 'rain',
+         'city', 'home', 'wild', 'moon', 'dance', 'sky', 'lost', 'young']
+
+
+def _seed(id):
+    return int(hashlib.md5(id.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def _name(id, words=2):
+    seed = _seed(id)
+    return ' '.join(WORDS[(seed >> (5 * i)) % len(WORDS)] for i in range(words)).title()
+
+
+def artist(id, full=True):
+    obj = {'id': id, 'type': 'artist', 'name': _name(id), 'uri': f'spotify:artist:{id}',
+           'href': f'https://api.spotify.com/v1/artists/{id}',
+           'external_urls': {'spotify': f'https://open.spotify.com/artist/{id}'}}
+    if full:
+        seed = _seed(id)
+        obj.update({'popularity': seed % 100, 'genres': [GENRES[seed % len(GENRES)], GENRES[seed // 7 % len(GENRES)]],
+                    'followers': {'href': None, 'total': seed % 100000},
+                    'images': [{'url': f'https://i.scdn.co/image/{id}{size}', 'height': size, 'width': size}
+                               for size in (640, 300, 64)]})
+    return obj
+
+
+def album(id, full=True):
+    seed = _seed(id)
+    obj = {'id': id, 'type': 'album', 'name': _name(id, 3), 'uri': f'spotify:album:{id}', 'album_type': 'album',
+           'href': f'https://api.spotify.com/v1/albums/{id}', 'total_tracks': 12,
+           'release_date': f'{1960 + seed % 64}-{1 + seed % 12:02d}-{1 + seed % 28:02d}',
+           'release_date_precision': 'day', 'available_markets': MARKETS,
+           'artists': [artist(f'ar{seed % 5000}', full=False)],
+           'images': [{'url': f'https://i.scdn.co/image/{id}{size}', 'height': size, 'width': size}
+                      for size in (640, 300, 64)]}
+    if full:
+        obj.update({'label': 'Mock Records', 'popularity': seed % 100, 'genres': [],
+                    'tracks': page([track(f'{id}t{i}', full=False) for i in range(12)], 0, 50, 12)})
+    return obj
+
+
+def track(id, full=True):
+    seed = _seed(id)
+    obj = {'id': id, 'type': 'track', 'name': _name(id, 3), 'uri': f'spotify:track:{id}',
+           'href': f'https://api.spotify.com/v1/tracks/{id}', 'duration_ms': 120000 + seed % 240000,
+           'explicit': bool(seed & 1), 'track_number': 1 + seed % 12, 'disc_number': 1, 'is_local': False,
+           'preview_url': None, 'available_markets': MARKETS,
+           'artists': [artist(f'ar{seed % 5000}', full=False)],
+           'external_urls': {'spotify': f'https://open.spotify.com/track/{id}'}}
+    if full:
+        obj.update({'popularity': seed % 100, 'album': album(f'al{seed % 20000}', full=False),
+                    'external_ids': {'isrc': f'US{seed:010d}'}})
+    return obj
+
+
+def audio_features(id):
+    seed = _seed(id)
+    rng = random.Random(seed)
+    return {'id': id, 'type': 'audio_features', 'uri': f'spotify:track:{id}', 'danceability': rng.random(),
+            'energy': rng.random(), 'key': seed % 12, 'loudness': -rng.random() * 30, 'mode': seed & 1,
+            'speechiness': rng.random(), 'acousticness': rng.random(), 'instrumentalness': rng.random(),
+            'liveness': rng.random(), 'valence': rng.random(), 'tempo': 60 + rng.random() * 120,
+            'duration_ms': 120000 + seed % 240000, 'time_signature': 4}
+
+
+def audio_analysis(id, segments=800):
+    rng = random.Random(_seed(id))
+
+    def interval(i, length):
+        return {'start': i * length, 'duration': length, 'confidence': rng.random()}
+
+    return {'track': {'duration': segments * 0.25, 'tempo': 120.0, 'key': 5, 'mode': 1, 'time_signature': 4},
+            'bars': [interval(i, 2.0) for i in range(segments // 8)],
+            'beats': [interval(i, 0.5) for i in range(segments // 2)],
+            'tatums': [interval(i, 0.25) for i in range(segments)],
+            'sections': [dict(interval(i, 20.0), loudness=-8.0, tempo=120.0, key=5, mode=1, time_signature=4)
+                         for i in range(segments // 80)],
+            'segments': [dict(interval(i, 0.25), loudness_start=-30.0, loudness_max=-10.0, loudness_max_time=0.05,
+                              loudness_end=-20.0, pitches=[rng.random() for _ in range(12)],
+                              timbre=[rng.uniform(-100, 100) for _ in range(12)]) for i in range(segments)]}
+
+
+def page(items, offset, limit, total, href=None):
+    next_url = None
+    if href and offset + limit < total:
+        next_url = f'{href}{"&" if "?" in href else "?"}offset={offset + limit}&limit={limit}'
+    return {'href': href, 'items': items, 'limit': limit, 'offset': offset, 'total': total, 'next': next_url,
+            'previous': None}
+
+
+class RateLimiter:
+    '''Allows rate requests per second, answers the rest with 429'''
+
+    def __init__(self, rate, retry_after):
+        self.rate = rate
+        self.retry_after = retry_after
+        self._window = int(time.monotonic())
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            return self._count <= self.rate
+
+
+class MockPlayer:
+    '''Playback state of the mock user, advancing through tracks of track_ms each'''
+
+    def __init__(self, track_ms=30000):
+        self.track_ms = track_ms
+        self.active = True
+        self.device_id = 'device0'
+        self.started = time.monotonic()
+        self.paused_at = None
+        self.lock = threading.Lock()
+
+    def _elapsed_ms(self):
+        return ((self.paused_at or time.monotonic()) - self.started) * 1000
+
+    def state(self, with_device=True):
+        with self.lock:
+            if not self.active:
+                return None
+            elapsed = self._elapsed_ms()
+            item = track(f'play{int(elapsed // self.track_ms)}')
+            item['duration_ms'] = self.track_ms
+            state = {'timestamp': int(time.time() * 1000), 'progress_ms': int(elapsed % self.track_ms),
+                     'is_playing': self.paused_at is None, 'item': item, 'currently_playing_type': 'track',
+                     'context': None}
+            if with_device:
+                state.update({'device': {'id': self.device_id, 'is_active': True, 'name': self.device_id,
+                                         'type': 'Computer', 'volume_percent': 50},
+                              'shuffle_state': False, 'repeat_state': 'off'})
+            return state
+
+    def pause(self):
+        with self.lock:
+            if self.paused_at is None:
+                self.paused_at = time.monotonic()
+
+    def play(self):
+        with self.lock:
+            if self.paused_at is not None:
+                self.started += time.monotonic() - self.paused_at
+                self.paused_at = None
+            self.active = True
+
+    def seek(self, position_ms):
+        with self.lock:
+            elapsed = self._elapsed_ms()
+            self.started += (elapsed - (elapsed // self.track_ms * self.track_ms + position_ms)) / 1000
+
+    def transfer(self, device_id):
+        with self.lock:
+            self.device_id = device_id
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockSpotify/1.0'
+
+    routes = [
+        (re.compile(r'^(tracks|albums|artists|audio-features)$'), 'several'),
+        (re.compile(r'^audio-analysis/(\w+)$'), 'audio_analysis'),
+        (re.compile(r'^playlists/(\w+)$'), 'playlist'),
+        (re.compile(r'^playlists/(\w+)/tracks$'), 'playlist_tracks'),
+        (re.compile(r'^albums/(\w+)/tracks$'), 'album_tracks'),
+        (re.compile(r'^artists/(\w+)/albums$'), 'artist_albums'),
+        (re.compile(r'^artists/(\w+)/related-artists$'), 'related_artists'),
+        (re.compile(r'^artists/(\w+)/top-tracks$'), 'top_tracks'),
+        (re.compile(r'^me/(tracks|albums)$'), 'saved'),
+        (re.compile(r'^me/(tracks|albums)/contains$'), 'saved_contains'),
+        (re.compile(r'^me/following$'), 'followed_artists'),
+        (re.compile(r'^me/player/recently-played$'), 'recently_played'),
+        (re.compile(r'^me/player$'), 'player'),
+        (re.compile(r'^me/player/currently-playing$'), 'currently_playing'),
+        (re.compile(r'^recommendations/available-genre-seeds$'), 'genre_seeds'),
+        (re.compile(r'^recommendations$'), 'recommendations'),
+        (re.compile(r'^search$'), 'search'),
+        (re.compile(r'^me$'), 'me'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=()):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _admit(self):
+        '''Count the request, apply latency and rate limiting; False if it was answered with 429'''
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        if server.limiter is not None and not server.limiter.allow():
+            with server.lock:
+                server.throttled_count += 1
+            self._send(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                       [('Retry-After', str(server.limiter.retry_after))])
+            return False
+        return True
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.startswith('/api/token'):
+            form = dict(urllib.parse.parse_qsl(body.decode('utf-8')))
+            if not self.headers.get('Authorization', '').startswith('Basic '):
+                return self._send(400, {'error': 'invalid_client'})
+            with self.server.lock:
+                self.server.token_count += 1
+                token = f'mock-token-{self.server.token_count}'
+            response = {'access_token': token, 'token_type': 'Bearer', 'expires_in': self.server.token_lifetime}
+            if form.get('grant_type') != 'client_credentials':
+                response['refresh_token'] = 'mock-refresh-token'
+            return self._send(200, response)
+        self._mutate()
+
+    def do_PUT(self):
+        self._read_body()
+        self._mutate()
+
+    def do_DELETE(self):
+        self._read_body()
+        self._mutate()
+
+    def _mutate(self):
+        if not self._admit():
+            return
+        path = urllib.parse.urlsplit(self.path).path
+        if re.match(r'^/v1/playlists/\w+/tracks$', path):
+            with self.server.lock:
+                self.server.snapshot_count += 1
+                snapshot_id = f'snapshot{self.server.snapshot_count}'
+            return self._send(201 if self.command == 'POST' else 200, {'snapshot_id': snapshot_id})
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        player = self.server.player
+        if path == '/v1/me/player/pause':
+            player.pause()
+        elif path == '/v1/me/player/play':
+            player.play()
+        elif path == '/v1/me/player/seek':
+            player.seek(int(query['position_ms']))
+        elif path == '/v1/me/player' and self.command == 'PUT':
+            player.transfer(query['device_ids'].split(',')[0])
+        self._send(204)
+
+    def do_GET(self):
+        if not self._admit():
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._send(401, {'error': {'status': 401, 'message': 'No token provided'}})
+
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path[len('/v1/'):] if url.path.startswith('/v1/') else url.path
+        query = dict(urllib.parse.parse_qsl(url.query))
+        base_query = urllib.parse.urlencode({k: v for k, v in query.items() if k not in PAGING_PARAMS})
+        href = f'http://{self.headers.get("Host")}{url.path}?{base_query}'
+
+        for pattern, name in self.routes:
+            match = pattern.match(path)
+            if match:
+                try:
+                    body = getattr(self, f'_{name}')(query, href, *match.groups())
+                except (KeyError, ValueError) as e:
+                    return self._send(400, {'error': {'status': 400, 'message': f'invalid request: {e}'}})
+                break
+        else:
+            return self._send(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+        if body is None:
+            return self._send(204)
+        payload = json.dumps(body).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(payload).hexdigest()
+        headers = [('ETag', etag), ('Cache-Control', f'public, max-age={self.server.max_age}')]
+        if self.headers.get('If-None-Match') == etag:
+            with self.server.lock:
+                self.server.not_modified_count += 1
+            return self._send(304, None, headers)
+        self._send(200, body, headers)
+
+    def _paged(self, query, href, total, make_item, default_limit=20, max_limit=50):
+        offset = int(query.get('offset', 0))
+        limit = min(int(query.get('limit', default_limit)), max_limit)
+        items = [make_item(i) for i in range(offset, min(offset + limit, total))]
+        return page(items, offset, limit, total, href)
+
+    def _several(self, query, href, kind):
+        ids = query['ids'].split(',')
+        limits = {'tracks': 50, 'albums': 20, 'artists': 50, 'audio-features': 100}
+        if len(ids) > limits[kind]:
+            raise ValueError('too many ids')
+        make = {'tracks': track, 'albums': album, 'artists': artist, 'audio-features': audio_features}[kind]
+        return {kind.replace('-', '_'): [make(id) for id in ids]}
+
+    def _audio_analysis(self, query, href, id):
+        return audio_analysis(id, self.server.analysis_segments)
+
+    def _playlist(self, query, href, id):
+        snapshot_id = f'{id}-snapshot'
+        if query.get('fields') == 'snapshot_id':
+            return {'snapshot_id': snapshot_id}
+        return {'id': id, 'type': 'playlist', 'name': _name(id), 'snapshot_id': snapshot_id,
+                'uri': f'spotify:playlist:{id}', 'tracks': self._playlist_tracks(query, href, id)}
+
+    def _playlist_tracks(self, query, href, id):
+        return self._paged(query, href, self.server.playlist_size,
+                           lambda i: {'added_at': f'2020-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z',
+                                      'added_by': {'id': 'mockuser', 'type': 'user'}, 'is_local': False,
+                                      'track': track(f'{id}i{i}')},
+                           default_limit=100, max_limit=100)
+
+    def _album_tracks(self, query, href, id):
+        return self._paged(query, href, 12, lambda i: track(f'{id}t{i}', full=False))
+
+    def _artist_albums(self, query, href, id):
+        return self._paged(query, href, 30, lambda i: album(f'{id}al{i}', full=False))
+
+    def _related_artists(self, query, href, id):
+        seed = _seed(id)
+        return {'artists': [artist(f'ar{(seed + i * 7919) % 5000}') for i in range(20)]}
+
+    def _top_tracks(self, query, href, id):
+        return {'tracks': [track(f'{id}top{i}') for i in range(10)]}
+
+    def _saved(self, query, href, kind):
+        make = track if kind == 'tracks' else album
+        return self._paged(query, href, self.server.library_size,
+                           lambda i: {'added_at': f'2020-12-31T23:{59 - i // 60 % 60:02d}:{59 - i % 60:02d}Z',
+                                      kind[:-1]: make(f'saved{i}')})
+
+    def _saved_contains(self, query, href, kind):
+        return [id.startswith('saved') for id in query['ids'].split(',')]
+
+    def _followed_artists(self, query, href):
+        total = self.server.library_size
+        start = int(query.get('after', 0))
+        limit = min(int(query.get('limit', 20)), 50)
+        items = [artist(str(i)) for i in range(start, min(start + limit, total))]
+        after = str(start + limit) if start + limit < total else None
+        return {'artists': {'items': items, 'limit': limit, 'total': total, 'cursors': {'after': after},
+                            'next': f'{href}&after={after}' if after else None, 'href': href}}
+
+    def _recently_played(self, query, href):
+        before = int(query.get('before', 1600000000000))
+        limit = min(int(query.get('limit', 20)), 50)
+        count = max(0, min(limit, (before - 1599990000000) // 60000))
+        items = [{'played_at': before - (i + 1) * 60000, 'track': track(f'played{before - (i + 1) * 60000}')}
+                 for i in range(count)]
+        oldest = str(before - count * 60000) if count == limit else None
+        return {'items': items, 'limit': limit, 'cursors': {'before': oldest, 'after': str(before)},
+                'next': f'{href}&before={oldest}' if oldest else None, 'href': href}
+
+    def _player(self, query, href):
+        return self.server.player.state()
+
+    def _currently_playing(self, query, href):
+        return self.server.player.state(with_device=False)
+
+    def _genre_seeds(self, query, href):
+        return {'genres': GENRES}
+
+    def _recommendations(self, query, href):
+        seeds = ','.join(query.get(f'seed_{kind}', '') for kind in ('artists', 'genres', 'tracks'))
+        limit = min(int(query.get('limit', 20)), 100)
+        base = _seed(seeds)
+        return {'seeds': [{'id': seed, 'type': 'seed'} for seed in seeds.split(',') if seed],
+                'tracks': [track(f'rec{(base + i * 104729) % 2000}') for i in range(limit)]}
+
+    def _search(self, query, href):
+        q = query['q']
+        offset = int(query.get('offset', 0))
+        if offset > 1000:
+            raise ValueError('offset too large')
+        body = {}
+        make = {'track': track, 'album': album, 'artist': artist}
+        for kind in query['type'].split(','):
+            body[f'{kind}s'] = self._paged(query, href, 1000, lambda i: make[kind](f'{kind[:2]}{_seed(q) % 9999}x{i}'))
+        return body
+
+    def _me(self, query, href):
+        return {'id': 'mockuser', 'type': 'user', 'display_name': 'Mock User', 'country': 'US'}
+
+
+class MockSpotifyServer(ThreadingHTTPServer):
+    '''Threaded mock API server, use as a context manager or call start()/stop()
+
+    latency and jitter are in seconds. With rate_limit set, requests beyond
+    rate_limit per second get a 429 with a Retry-After of retry_after
+    seconds.
+    '''
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, rate_limit=None, retry_after=1,
+                 max_age=0, playlist_size=10000, library_size=2000, analysis_segments=800, token_lifetime=3600,
+                 track_ms=30000):
+        super().__init__((host, port), MockHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = RateLimiter(rate_limit, retry_after) if rate_limit else None
+        self.max_age = max_age
+        self.playlist_size = playlist_size
+        self.library_size = library_size
+        self.analysis_segments = analysis_segments
+        self.token_lifetime = token_lifetime
+        self.player = MockPlayer(track_ms)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.throttled_count = 0
+        self.not_modified_count = 0
+        self.token_count = 0
+        self.snapshot_count = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_prefix(self):
+        return f'{self.base_url}/v1/'
+
+    @property
+    def token_url(self):
+        return f'{self.base_url}/api/token'
+
+    def client_class(self, base):
+        '''Subclass of the client class base that talks to this server'''
+        return type(f'Local{base.__name__}', (base,), {'_api_prefix': self.api_prefix, '_token_url': self.token_url})
+
+    def stats(self):
+        return {'requests': self.request_count, 'throttled': self.throttled_count,
+                'not_modified': self.not_modified_count, 'tokens': self.token_count}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra latency, seconds')
+    parser.add_argument('--rate-limit', type=int, default=None, help='requests per second before 429s')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--max-age', type=int, default=0, help='Cache-Control max-age of responses')
+    parser.add_argument('--playlist-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    server = MockSpotifyServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                               rate_limit=args.rate_limit, retry_after=args.retry_after, max_age=args.max_age,
+                               playlist_size=args.playlist_size)
+    print(f'mock Spotify API on {server.api_prefix}, token endpoint {server.token_url}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''Offline benchmarks of pyotify against the local mock server
+
+Every workload/configuration pair runs in a fresh process, so peak RSS and
+allocations are measured for that run alone. The mock server runs in the
+parent process and needs no network access.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --latency 0.02 --workloads playlist_crawl --configs baseline,prefetch,async
+    python benchmarks/run.py --json results.json
+'''
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_server import MockSpotifyServer  # noqa: E402
+
+
+def _memory_cache():
+    from pyotify.cache import MemoryCache
+    return MemoryCache(maxsize=100000, ttl=3600)
+
+
+CONFIGS = {
+    'baseline': {},
+    'prefetch': {'prefetch': 4},
+    'cache': {'kwargs': {'cache': _memory_cache}},
+    'coalesce': {'kwargs': {'coalesce': True}},
+    'models': {'kwargs': {'models': True}},
+    'async': {'client': 'async', 'prefetch': 4},
+}
+
+
+def bulk_tracks(client, size, config):
+    ids = [f'bench{random.randrange(size)}' for _ in range(size)]
+    return len(client.bulk_tracks(ids))
+
+
+def playlist_crawl(client, size, config):
+    return sum(1 for _ in client.paginate(client.playlist_tracks, 'benchplaylist', prefetch=config.get('prefetch', 0)))
+
+
+def concurrent_search(client, size, config):
+    queries = [f'query {random.randrange(max(1, size // 4))}' for _ in range(size)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        return sum(1 for _ in executor.map(lambda q: client.search(q, 'track', limit=20), queries))
+
+
+async def bulk_tracks_async(client, size, config):
+    ids = [f'bench{random.randrange(size)}' for _ in range(size)]
+    return len(await client.bulk_tracks(ids))
+
+
+async def playlist_crawl_async(client, size, config):
+    count = 0
+    async for _ in client.paginate(client.playlist_tracks, 'benchplaylist', prefetch=config.get('prefetch', 0)):
+        count += 1
+    return count
+
+
+async def concurrent_search_async(client, size, config):
+    queries = [f'query {random.randrange(max(1, size // 4))}' for _ in range(size)]
+    return len(await asyncio.gather(*(client.search(q, 'track', limit=20) for q in queries)))
+
+
+WORKLOADS = {
+    'bulk_tracks': (bulk_tracks, bulk_tracks_async),
+    'playlist_crawl': (playlist_crawl, playlist_crawl_async),
+    'concurrent_search': (concurrent_search, concurrent_search_async),
+}
+
+
+def _timed_class(base, is_async):
+    '''Subclass of base recording the latency of every API call it makes, cached or not'''
+    if is_async:
+        class Timed(base):
+            async def _dispatch(self, *args):
+                start = time.perf_counter()
+                try:
+                    return await super()._dispatch(*args)
+                finally:
+                    self.latencies.append(time.perf_counter() - start)
+    else:
+        class Timed(base):
+            def _dispatch(self, *args):
+                start = time.perf_counter()
+                try:
+                    return super()._dispatch(*args)
+                finally:
+                    self.latencies.append(time.perf_counter() - start)
+    return Timed
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_one(api_prefix, token_url, workload, config_name, size, trace, seed):
+    '''Run one workload with one configuration and return its measurements'''
+    from pyotify import Spotify, AsyncSpotify
+
+    random.seed(seed)
+    config = CONFIGS[config_name]
+    is_async = config.get('client') == 'async'
+    base = AsyncSpotify if is_async else Spotify
+    cls = type(f'Local{base.__name__}', (_timed_class(base, is_async),),
+               {'_api_prefix': api_prefix, '_token_url': token_url})
+    kwargs = {key: value() if callable(value) else value for key, value in config.get('kwargs', {}).items()}
+    client = cls('bench-client', 'bench-secret', **kwargs)
+    client.latencies = []
+    client.token_manager.get_token()
+    func = WORKLOADS[workload][1 if is_async else 0]
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if is_async:
+        async def main():
+            async with client:
+                return await func(client, size, config)
+        items = asyncio.run(main())
+    else:
+        items = func(client, size, config)
+    elapsed = time.perf_counter() - start
+    peak_traced = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+    client.token_manager.stop()
+
+    latencies = client.latencies
+    return {
+        'workload': workload,
+        'config': config_name,
+        'items': items,
+        'calls': len(latencies),
+        'seconds': elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'peak_alloc_kib': peak_traced / 1024 if peak_traced is not None else None,
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _child(queue, *args):
+    try:
+        queue.put(run_one(*args))
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+
+def run_isolated(*args):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, *args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def format_table(results):
+    header = ('workload', 'config', 'calls', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'alloc KiB', 'rss KiB')
+    rows = [header]
+    for r in results:
+        if 'error' in r:
+            rows.append((r['workload'], r['config'], r['error'], '', '', '', '', '', ''))
+            continue
+        alloc = f'{r["peak_alloc_kib"]:.0f}' if r['peak_alloc_kib'] is not None else '-'
+        rows.append((r['workload'], r['config'], str(r['calls']), str(r['requests']),
+                     f'{r["requests_per_second"]:.1f}', f'{r["p50_ms"]:.2f}', f'{r["p99_ms"]:.2f}', alloc,
+                     str(r['peak_rss_kib'])))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--configs', default=','.join(CONFIGS))
+    parser.add_argument('--size', type=int, default=2000, help='IDs, playlist items or searches per workload')
+    parser.add_argument('--latency', type=float, default=0.005, help='mock server latency per request, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None, help='mock server requests per second before 429s')
+    parser.add_argument('--no-trace', action='store_true', help='skip tracemalloc, which slows the client down')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    with MockSpotifyServer(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                           playlist_size=args.size) as server:
+        for workload in args.workloads.split(','):
+            for config in args.configs.split(','):
+                before = server.stats()['requests']
+                result = run_isolated(server.api_prefix, server.token_url, workload, config, args.size,
+                                      not args.no_trace, args.seed)
+                if 'error' not in result:
+                    # Requests that reached the server; calls answered by a cache or coalesced never do.
+                    result['requests'] = server.stats()['requests'] - before
+                    result['requests_per_second'] = result['requests'] / result['seconds'] if result['seconds'] else 0.0
+                result.setdefault('workload', workload)
+                result.setdefault('config', config)
+                results.append(result)
+                print(format_table(results[-1:]).splitlines()[-1], file=sys.stderr)
+        server_stats = server.stats()
+
+    print(format_table(results))
+    print(f'\nmock server: {server_stats}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'results': results, 'server': server_stats, 'options': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''Cold start benchmark: import time and time to first request
+
+Every sample runs in a fresh interpreter against the local mock server:
+
+    python benchmarks/startup.py --repeat 20
+'''
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_server import MockSpotifyServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = '''
+import json, time
+start = time.perf_counter()
+import pyotify
+imported = time.perf_counter()
+cls = getattr(pyotify, {client!r})
+loaded = time.perf_counter()
+cls = type('Local', (cls,), {{'_api_prefix': {api_prefix!r}, '_token_url': {token_url!r}}})
+client = cls('bench-client', 'bench-secret')
+constructed = time.perf_counter()
+if {client!r} == 'AsyncSpotify':
+    import asyncio
+
+    async def first_request():
+        async with client:
+            return await client.tracks('startup')
+    asyncio.run(first_request())
+else:
+    client.tracks('startup')
+requested = time.perf_counter()
+client.token_manager.stop()
+print(json.dumps({{'import': imported - start, 'class': loaded - imported, 'construct': constructed - loaded,
+                  'first_request': requested - constructed, 'total': requested - start}}))
+'''
+
+
+def sample(client, server):
+    code = SAMPLE.format(client=client, api_prefix=server.api_prefix, token_url=server.token_url)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    output = subprocess.run([sys.executable, '-c', code], env=env, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--clients', default='Spotify,AsyncSpotify')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock server latency per request, seconds')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with MockSpotifyServer(latency=args.latency) as server:
+        for client in args.clients.split(','):
+            samples = [sample(client, server) for _ in range(args.repeat)]
+            results[client] = {phase: statistics.median(s[phase] for s in samples) * 1000
+                               for phase in ('import', 'class', 'construct', 'first_request', 'total')}
+
+    phases = ('import', 'class', 'construct', 'first_request', 'total')
+    print(f'median of {args.repeat} cold starts, ms')
+    print('client        ' + ''.join(f'{phase:>15}' for phase in phases))
+    for client, result in results.items():
+        print(f'{client:<14}' + ''.join(f'{result[phase]:>15.2f}' for phase in phases))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'results': results, 'options': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,31 @@
-from .client import Spotify
+import importlib
 
 __version__ = '0.0.1'
 
 __all__ = [
-    Spotify
+    'Spotify',
+    'AsyncSpotify',
+    'SpotifyPool',
+    'AsyncSpotifyPool',
 ]
+
+# Submodules are imported on first access, so `import pyotify` does not pull in requests or aiohttp.
+_modules = {
+    'Spotify': 'client',
+    'AsyncSpotify': 'aio',
+    'SpotifyPool': 'pool',
+    'AsyncSpotifyPool': 'pool',
+}
+
+
+def __getattr__(name):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
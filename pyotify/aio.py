@@ -0,0 +1,264 @@
+import time
+import asyncio
+import inspect
+from collections import deque
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import pyotify.utils as utils
+import pyotify.paging as paging
+import pyotify.models as models
+import pyotify.transport as transport
+from .client import Spotify
+from .scheduler import IDEMPOTENT_METHODS
+from .coalesce import AsyncSingleFlight, request_key
+
+
+def _trace_config():
+    '''aiohttp tracing that adds connection setup time to the RequestRecord passed as trace_request_ctx'''
+    async def on_connection_create_start(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx.connect += time.perf_counter() - context.connect_started
+
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    return config
+
+
+class AsyncSpotify(Spotify):
+    '''asyncio counterpart of Spotify
+
+    Every endpoint method of Spotify is available and returns an awaitable.
+    All requests share one keep-alive connection pool of at most
+    max_connections connections, and at most concurrency requests are in
+    flight at any time.
+    '''
+    max_connections = 100
+
+    def __init__(self, client_id, client_secret, redirect_uri=None, state=None,
+                 scope=None, show_dialog=False, cached_token_path=None, cache=None, scheduler=None,
+                 token_manager=None, coalesce=False, models=False, instrumentation=None, store=None,
+                 index=None, max_connections=None, concurrency=None, transport=None):
+        if aiohttp is None and transport is None:
+            raise ImportError('AsyncSpotify requires aiohttp, install it with: pip install pyotify[async]')
+
+        super().__init__(client_id, client_secret, redirect_uri=redirect_uri, state=state, scope=scope,
+                         show_dialog=show_dialog, cached_token_path=cached_token_path, cache=cache,
+                         scheduler=scheduler, token_manager=token_manager, coalesce=coalesce, models=models,
+                         instrumentation=instrumentation, store=store, index=index,
+                         max_connections=max_connections, transport=transport)
+        self.concurrency = concurrency or self.max_connections
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError('use async with for AsyncSpotify')
+
+    async def close(self):
+        for token_manager in self._token_managers:
+            token_manager.stop()
+        if self._transport is not None:
+            await self._transport.close()
+            self._transport = None
+        self._semaphore = None
+
+    def _create_transport(self):
+        trace_configs = [_trace_config()] if self.instrumentation is not None else None
+        return transport.AiohttpTransport(max_connections=self.max_connections,
+                                          keepalive_timeout=self.keepalive_timeout, trace_configs=trace_configs)
+
+    async def _request(self, scheduler, method, url, headers, params, kwargs, record=None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            if record is None:
+                return await self.transport.request(method, url, headers, params, scheduler.timeout, **kwargs)
+
+            record.attempts += 1
+            connect = record.connect
+            start = time.perf_counter()
+            response = await self.transport.request(method, url, headers, params, scheduler.timeout, record,
+                                                    **kwargs)
+            record.wait += response.elapsed - (record.connect - connect)
+            record.download += max(0.0, time.perf_counter() - start - response.elapsed)
+            record.status = response.status_code
+            record.bytes += len(response.content)
+            return response
+
+    async def _send(self, scheduler, method, url, headers, params, kwargs, record=None):
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            await scheduler.wait_async()
+            try:
+                response = await self._request(scheduler, method, url, headers, params, kwargs, record)
+            except self.transport.errors as e:
+                # Errors while connecting are safe to retry, nothing reached the API yet.
+                delay = scheduler.retry_after(attempt, idempotent=idempotent or not self.transport.sent(e))
+                if delay is None:
+                    raise
+            else:
+                if response.status_code < 400:
+                    return response
+                delay = scheduler.retry_after(attempt, response.status_code, response.headers, idempotent)
+                if delay is None:
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _create_coalescer(self):
+        return AsyncSingleFlight()
+
+    async def _api_call(self, method, url, request=None, params=None, **kwargs):
+        if self.coalescer is not None and method == 'GET' and not kwargs:
+            params = utils.clean_params(params)
+            return await self.coalescer.do(request_key(method, url, params),
+                                           lambda: self._fetch(method, url, request, params, kwargs))
+        return await self._fetch(method, url, request, params, kwargs)
+
+    async def _fetch(self, method, url, request, params, kwargs):
+        result = await self._dispatch(method, url, request, params, kwargs)
+        if self.index is not None and method == 'GET':
+            self.index.add_response(result)
+        return models.parse(result) if self.models else result
+
+    async def _dispatch(self, method, url, request, params, kwargs):
+        return await self._call(self.token_manager, self.scheduler, method, url, request, params, kwargs)
+
+    async def _call(self, token_manager, scheduler, method, url, request, params, kwargs):
+        if self.instrumentation is None:
+            return await self._perform(token_manager, scheduler, method, url, request, params, kwargs, None)
+        record = self.instrumentation.start(method, url)
+        try:
+            return await self._perform(token_manager, scheduler, method, url, request, params, kwargs, record)
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.instrumentation.finish(record)
+
+    async def _perform(self, token_manager, scheduler, method, url, request, params, kwargs, record):
+        path, url = url, self._api_prefix + url
+        params = utils.clean_params(params)
+
+        token = await token_manager.get_token_async()
+        headers = self._get_authorization_headers(token)
+
+        cache_key, entry = self._cache_lookup(method, path, url, params, headers)
+        if entry is not None and entry.is_fresh():
+            if record is not None:
+                record.cached = True
+            return entry.value
+
+        response = await self._send(scheduler, method, url, headers, params, kwargs, record)
+
+        if response.status_code == 401:
+            token = await asyncio.get_running_loop().run_in_executor(None, token_manager.refresh, token)
+            headers.update(self._get_authorization_headers(token))
+            response = await self._send(scheduler, method, url, headers, params, kwargs, record)
+
+        if response.status_code == 304 and entry is not None:
+            if record is not None:
+                record.cached = True
+            return self.cache.revalidated(cache_key, entry, response.headers)
+
+        response.raise_for_status()
+
+        if response.content == b'':
+            return utils.empty_response(request)
+
+        if record is None:
+            data = utils.json_loads(response.content)
+        else:
+            start = time.perf_counter()
+            data = utils.json_loads(response.content)
+            record.decode = time.perf_counter() - start
+        if cache_key is not None:
+            self.cache.store(cache_key, data, response.headers)
+        return data
+
+    async def _fan_out(self, func, arg_lists):
+        return await asyncio.gather(*(func(*args) for args in arg_lists))
+
+    async def _sequence(self, func, arg_lists):
+        return [await func(*args) for args in arg_lists]
+
+    async def _collect(self, items):
+        return [item async for item in items]
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _then(self, result, callback):
+        value = callback(await result)
+        # Lets callbacks chain another request, as RecommendationEngine.recommend() does.
+        return await value if inspect.isawaitable(value) else value
+
+    async def _completed(self, value):
+        return value
+
+    async def paginate(self, method, *args, prefetch=0, **kwargs):
+        name = method.__name__
+        key = paging.envelope_key(name, args, kwargs)
+        kwargs.setdefault('limit', paging.page_limit(name))
+        if name == 'search':
+            # An explicit offset keeps a SearchIndex from answering a first page that has no next pages.
+            kwargs.setdefault('offset', 0)
+
+        if name in paging.CURSORS:
+            async for item in self._paginate_cursor(method, name, key, *args, **kwargs):
+                yield item
+            return
+
+        page = paging.unwrap(await method(*args, **kwargs), key)
+        for item in paging.items(page):
+            yield item
+
+        async def fetch(offset):
+            return paging.items(paging.unwrap(await method(*args, **{**kwargs, 'offset': offset}), key))
+
+        items = self._prefetch(fetch, paging.remaining_offsets(name, page), prefetch)
+        try:
+            async for item in items:
+                yield item
+        finally:
+            # Cancels the prefetched pages as soon as the caller stops, not when the generator is collected.
+            await items.aclose()
+
+    async def _prefetch(self, fetch, offsets, prefetch):
+        '''Items of the pages at offsets, with up to prefetch pages requested ahead'''
+        pending = deque()
+        try:
+            for offset in offsets:
+                pending.append(asyncio.ensure_future(fetch(offset)))
+                if len(pending) > prefetch:
+                    for item in await pending.popleft():
+                        yield item
+            while pending:
+                for item in await pending.popleft():
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _paginate_cursor(self, method, name, key, *args, **kwargs):
+        cursor = paging.CURSORS[name]
+        while True:
+            page = paging.unwrap(await method(*args, **kwargs), key)
+            for item in paging.items(page):
+                yield item
+            kwargs[cursor] = paging.next_cursor(name, page)
+            if kwargs[cursor] is None:
+                return
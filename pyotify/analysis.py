@@ -0,0 +1,111 @@
+'''NumPy views of audio analysis and audio features responses
+
+Requires numpy (pip install pyotify[numpy]).
+'''
+import numpy as np
+
+from . import utils
+
+
+def _column(objects, key, dtype=np.float32):
+    return np.fromiter((o.get(key) or 0 for o in objects), dtype=dtype, count=len(objects))
+
+
+def _matrix(objects, key, width=12):
+    matrix = np.zeros((len(objects), width), dtype=np.float32)
+    for row, o in enumerate(objects):
+        matrix[row, :len(o[key])] = o[key]
+    return matrix
+
+
+class Intervals:
+    '''Beats, bars or tatums as start, duration and confidence columns'''
+    __slots__ = ('start', 'duration', 'confidence')
+
+    def __init__(self, objects):
+        self.start = _column(objects, 'start')
+        self.duration = _column(objects, 'duration')
+        self.confidence = _column(objects, 'confidence')
+
+    def __len__(self):
+        return len(self.start)
+
+
+class Sections(Intervals):
+    __slots__ = ('loudness', 'tempo', 'key', 'mode', 'time_signature')
+
+    def __init__(self, objects):
+        super().__init__(objects)
+        self.loudness = _column(objects, 'loudness')
+        self.tempo = _column(objects, 'tempo')
+        self.key = _column(objects, 'key', np.int8)
+        self.mode = _column(objects, 'mode', np.int8)
+        self.time_signature = _column(objects, 'time_signature', np.int8)
+
+
+class Segments(Intervals):
+    '''Segments with N x 12 float32 pitches and timbre matrices'''
+    __slots__ = ('loudness_start', 'loudness_max', 'loudness_max_time', 'loudness_end', 'pitches', 'timbre')
+
+    def __init__(self, objects):
+        super().__init__(objects)
+        self.loudness_start = _column(objects, 'loudness_start')
+        self.loudness_max = _column(objects, 'loudness_max')
+        self.loudness_max_time = _column(objects, 'loudness_max_time')
+        self.loudness_end = _column(objects, 'loudness_end')
+        self.pitches = _matrix(objects, 'pitches')
+        self.timbre = _matrix(objects, 'timbre')
+
+
+class AudioAnalysis:
+    __slots__ = ('track', 'bars', 'beats', 'tatums', 'sections', 'segments')
+
+    def __init__(self, data):
+        track = data.get('track') or {}
+        self.track = {key: value for key, value in track.items() if not key.endswith('string')}
+        self.bars = Intervals(data.get('bars') or [])
+        self.beats = Intervals(data.get('beats') or [])
+        self.tatums = Intervals(data.get('tatums') or [])
+        self.sections = Sections(data.get('sections') or [])
+        self.segments = Segments(data.get('segments') or [])
+
+
+class FeatureMatrix:
+    '''Audio features of many tracks as one float32 matrix, one row per track ID
+
+    Tracks without features get a row of NaN.
+    '''
+    columns = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+               'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature')
+
+    def __init__(self, ids, values):
+        self.ids = ids
+        self.values = values
+        self.index = {id: row for row, id in enumerate(ids)}
+
+    @classmethod
+    def from_features(cls, ids, features):
+        ids = utils.dedupe(ids)
+        by_id = {}
+        for f in features:
+            if f is None:
+                continue
+            if not isinstance(f, dict):
+                f = {name: getattr(f, name) for name in ('id',) + cls.columns}
+            by_id[f['id']] = f
+
+        values = np.full((len(ids), len(cls.columns)), np.nan, dtype=np.float32)
+        for row, id in enumerate(ids):
+            f = by_id.get(id)
+            if f is not None:
+                values[row] = [np.nan if f.get(name) is None else f[name] for name in cls.columns]
+        return cls(ids, values)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, id):
+        return self.values[self.index[id]]
+
+    def column(self, name):
+        return self.values[:, self.columns.index(name)]
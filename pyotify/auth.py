@@ -1,12 +1,14 @@
 import os
 import json
+import weakref
+import logging
+import threading
 import urllib.parse
-import requests
-
-
 
 from . import utils
 
+logger = logging.getLogger(__name__)
+
 OAUTH_TOKEN_URL = 'https://accounts.spotify.com/api/token'
 OAUTH_AUTHORIZE_URL = 'https://accounts.spotify.com/authorize'
 redirect_uri = 'http://localhost:8888/callback/'
@@ -14,56 +16,39 @@ redirect_uri = 'http://localhost:8888/callback/'
 class SpotifyAuthError(Exception):
     pass
 
+
+def _post(session, url, **kwargs):
+    # requests is only imported once a token is actually requested.
+    if session is None:
+        import requests
+        session = requests
+    return session.post(url, **kwargs)
+
+
 class SpotifyClientCredentialsAuth():
-    def __init__(self, session, client_id, client_secret):
+    def __init__(self, session, client_id, client_secret, token_url=OAUTH_TOKEN_URL):
         self.session = session
         self.client_id = client_id
         self.client_secret = client_secret
-        self.access_code = None
+        self.token_url = token_url
         self.token = None
 
     def get_access_token(self):
         if not self.token or utils.is_token_expired(self.token):
-            self.access_code = self._request_access_code()
-            self.token = self._request_token()
-            utils.add_custom_values_to_token(self.token)
-            return self.token['access_token']
+            self.token = self.request_token()
         return self.token['access_token']
 
-    def _request_token(self):
-        data = {
-            'grant_type': 'authorization_code',
-            'code': self.access_code,
-            'redirect_uri': redirect_uri,
-
-        }
-
-        headers = utils.get_authorization_headers(self.client_id, self.client_secret)
-
-        response = requests.post(OAUTH_TOKEN_URL, data=data, headers=headers)
-        token = json.loads(response.text)
-
-        return token
-
-    def _request_access_code(self):
-        with open('scopes.txt', 'r') as f:
-            scope = f.read()
-        params = {
-            'client_id': self.client_id,
-            'response_type': 'code',
-            'redirect_uri': redirect_uri,
-            'scope': scope
-        }
+    def request_token(self, token=None):
+        data = {'grant_type': 'client_credentials'}
 
         headers = utils.get_authorization_headers(self.client_id, self.client_secret)
 
-        response = requests.get(OAUTH_AUTHORIZE_URL, params=params, headers=headers)
+        response = _post(self.session, self.token_url, data=data, headers=headers)
 
-        response.raise_for_status()
+        if response.status_code != 200:
+            raise SpotifyAuthError(f'client credentials request failed: {response.status_code} {response.text}')
 
-        print(response.url)
-        code = input('login to spotify and return the code parameter in console:')
-        return code
+        return utils.add_custom_values_to_token(response.json())
 
     def is_token_expired(self, token):
         return utils.is_token_expired(token)
@@ -72,18 +57,57 @@ class SpotifyClientCredentialsAuth():
         return utils.add_custom_values_to_token(token)
 
 class SpotifyUserAuth():
-    def __init__(self, client_id, client_secret, redirect_uri, state=None, scope=None, cached_token_path=None):
+    def __init__(self, client_id, client_secret, redirect_uri, state=None, scope=None, cached_token_path=None,
+                 token_url=OAUTH_TOKEN_URL):
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.state = state
-        self.scope = utils.normalize_scope(scope)
+        self.scope = utils.normalize_scope(scope) if scope else None
         self.cached_token_path = cached_token_path
+        self.token_url = token_url
+
+    def request_token(self, token=None):
+        if token is None:
+            token = self.get_cached_token()
+            if token is None:
+                raise SpotifyAuthError('no cached user token, authorize via get_authorize_url() '
+                                       'and request_access_token(code) first')
+        elif 'refresh_token' in token:
+            token = self.refresh_access_token(token['refresh_token'])
+        else:
+            raise SpotifyAuthError('user token expired and has no refresh_token')
+        self.save_token(token)
+        return token
+
+    def request_access_token(self, code):
+        payload = {
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': self.redirect_uri}
+
+        headers = self._get_authorization_headers()
+
+        response = _post(None, self.token_url, data=payload, headers=headers)
+
+        response.raise_for_status()
+
+        token = utils.add_custom_values_to_token(response.json(), self.scope)
+        self.save_token(token)
+        return token
+
+    def save_token(self, token):
+        if not self.cached_token_path:
+            return
+        tmp_path = f'{self.cached_token_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(token))
+        os.replace(tmp_path, self.cached_token_path)
 
     def get_cached_token(self):
         token = None
 
-        if os.path.exists(self.cached_token_path):
+        if self.cached_token_path and os.path.exists(self.cached_token_path):
             with open(self.cached_token_path, 'r') as f:
                 token = json.loads(f.read())
             if 'scope' not in token:
@@ -122,7 +146,7 @@ class SpotifyUserAuth():
 
         headers = self._get_authorization_headers()
 
-        response = requests.post(OAUTH_TOKEN_URL, data=payload, headers=headers)
+        response = _post(None, self.token_url, data=payload, headers=headers)
 
         response.raise_for_status()
 
@@ -131,3 +155,85 @@ class SpotifyUserAuth():
         if 'refresh_token' not in token:
             token['refresh_token'] = refresh_token
         return token
+
+
+class TokenManager():
+    '''Keeps an access token in memory and refreshes it before it expires
+
+    The first token is fetched on the first get_token() call. After that a
+    daemon timer refreshes it refresh_margin seconds before it expires, so
+    callers normally never wait on the token endpoint. Any number of threads
+    may share one manager; concurrent refreshes collapse into one request.
+
+    The timer only refreshes tokens that were used since the last refresh,
+    so an idle manager stops refreshing and its next get_token() fetches a
+    new token in the foreground. The timer holds no reference to the
+    manager, a manager that is no longer used elsewhere is collected.
+    timer is called like threading.Timer to create it.
+    '''
+    def __init__(self, auth, refresh_margin=300, background=True, timer=threading.Timer):
+        self.auth = auth
+        self.refresh_margin = refresh_margin
+        self.background = background
+        self.timer = timer
+        self.token = None
+        self._used = False
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def get_token(self):
+        token = self.token
+        if token is None or utils.is_token_expired(token):
+            token = self.refresh(token)
+        self._used = True
+        return token
+
+    async def get_token_async(self):
+        import asyncio
+        token = self.token
+        if token is None or utils.is_token_expired(token):
+            token = await asyncio.get_running_loop().run_in_executor(None, self.refresh, token)
+        self._used = True
+        return token
+
+    def get_access_token(self):
+        return self.get_token()['access_token']
+
+    def refresh(self, stale=None):
+        '''Replace the stale token and return the new one
+
+        If another caller already replaced stale, its token is returned
+        instead of fetching a new one.
+        '''
+        with self._lock:
+            if self.token is not None and self.token is not stale:
+                return self.token
+            self.token = self.auth.request_token(self.token)
+            self._used = False
+            self._schedule_refresh(self.token)
+            return self.token
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_refresh(self, token):
+        if not self.background:
+            return
+        self.stop()
+        delay = max(0, token['expires_at'] - utils.now() - self.refresh_margin)
+        self._timer = self.timer(delay, _background_refresh, args=(weakref.ref(self), token))
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def _background_refresh(manager_ref, token):
+    manager = manager_ref()
+    if manager is None or not manager._used:
+        return
+    try:
+        manager.refresh(token)
+    except Exception:
+        # The next get_token() retries in the foreground once the token expires.
+        logger.warning('background token refresh failed', exc_info=True)
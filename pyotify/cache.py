@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+_max_age_re = re.compile(r'max-age=(\d+)')
+
+
+def _copy(value):
+    '''Copy of a decoded JSON value, much faster than copy.deepcopy'''
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class CacheEntry:
+    __slots__ = ('value', 'etag', 'max_age', 'expires_at')
+
+    def __init__(self, value, etag=None, max_age=0, expires_at=0):
+        self.value = value
+        self.etag = etag
+        self.max_age = max_age
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        return self.expires_at > time.time()
+
+
+class ResponseCache:
+    '''Base class of the response caches used by Spotify._api_call
+
+    Entries live for the max-age the API sends in Cache-Control, or for ttl
+    seconds if it sends none. Stale entries that carry an ETag are revalidated
+    with If-None-Match, so a 304 reuses the stored body. Responses of the
+    current user's and other users' endpoints (me, me/..., users/...) depend
+    on the token that asked, so they are never cached.
+    '''
+    skip_prefixes = ('me/', 'users/')
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._counters_lock = threading.Lock()
+
+    def key(self, url, params):
+        return url + '?' + '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+
+    def cacheable(self, path):
+        # The slash makes 'me/' skip the me endpoint itself as well.
+        return not (path + '/').startswith(self.skip_prefixes)
+
+    def lookup(self, key):
+        entry = self.get(key)
+        if entry is not None and entry.is_fresh():
+            with self._counters_lock:
+                self.hits += 1
+        return entry
+
+    def store(self, key, value, headers):
+        with self._counters_lock:
+            self.misses += 1
+        max_age = self._max_age(headers, self.ttl)
+        self.set(key, CacheEntry(value, headers.get('ETag'), max_age, time.time() + max_age))
+
+    def revalidated(self, key, entry, headers):
+        with self._counters_lock:
+            self.revalidations += 1
+        entry.max_age = self._max_age(headers, entry.max_age)
+        entry.expires_at = time.time() + entry.max_age
+        entry.etag = headers.get('ETag', entry.etag)
+        self.set(key, entry)
+        return entry.value
+
+    def stats(self):
+        with self._counters_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations}
+
+    def _max_age(self, headers, default):
+        match = _max_age_re.search(headers.get('Cache-Control', ''))
+        return int(match.group(1)) if match else default
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    '''Thread-safe in-memory LRU cache holding at most maxsize responses
+
+    Values are copied in and out, so callers may modify the responses they
+    get without changing the cached ones.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=300):
+        super().__init__(ttl=ttl)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return CacheEntry(_copy(entry.value), entry.etag, entry.max_age, entry.expires_at)
+
+    def set(self, key, entry):
+        entry = CacheEntry(_copy(entry.value), entry.etag, entry.max_age, entry.expires_at)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache(ResponseCache):
+    '''On-disk cache storing one JSON file per response in directory
+
+    Once more than max_entries files exist, the least recently written
+    ones are removed. Unreadable or corrupt files count as misses and are
+    deleted.
+    '''
+    prune_interval = 100
+
+    def __init__(self, directory, max_entries=None, ttl=300):
+        super().__init__(ttl=ttl)
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return CacheEntry(data['value'], data['etag'], data['max_age'], data['expires_at'])
+        except OSError:
+            return None
+        except (KeyError, TypeError, ValueError):
+            # A truncated or foreign file, the response is fetched and written again.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def set(self, key, entry):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'value': entry.value, 'etag': entry.etag,
+                       'max_age': entry.max_age, 'expires_at': entry.expires_at}, f)
+        os.replace(tmp_path, path)
+
+        with self._counters_lock:
+            self._writes += 1
+            prune = self.max_entries and self._writes % self.prune_interval == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
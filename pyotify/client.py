@@ -1,7 +1,13 @@
 import json
-import requests
+import time
+from collections import deque
 import pyotify.utils as utils
 import pyotify.auth as auth
+import pyotify.paging as paging
+import pyotify.models as models
+import pyotify.transport as transport
+from .scheduler import RequestScheduler, IDEMPOTENT_METHODS
+from .coalesce import SingleFlight, request_key
 
 
 class Spotify:
@@ -10,38 +16,192 @@ class Spotify:
     https://developer.spotify.com/documentation/web-api/reference/
     '''
     _api_prefix = 'https://api.spotify.com/v1/'
+    _token_url = auth.OAUTH_TOKEN_URL
     max_retries = 10
     api_call_timeout = None
+    rate_limit = None
+    max_workers = 8
+    max_connections = 10
+    keepalive_timeout = 30
 
     def __init__(self, client_id, client_secret, redirect_uri=None, state=None,
-                 scope=None, show_dialog=False, cached_token_path=None):
+                 scope=None, show_dialog=False, cached_token_path=None, cache=None, scheduler=None,
+                 token_manager=None, coalesce=False, models=False, instrumentation=None, store=None,
+                 index=None, max_connections=None, transport=None):
 
-        self._session = requests.Session()
+        self._transport = transport
+        self.max_connections = max_connections or self.max_connections
         self.client_id = client_id
         self.client_secret = client_secret
-        self.token = auth.SpotifyClientCredentialsAuth(self._session, client_id, client_secret).get_access_token()
         self.redirect_uri = redirect_uri
         self.state = state
         self.scope = utils.normalize_scope(scope) if scope else None
         self.show_dialog = show_dialog
-        # self.cached_token_path = self.cached_token_path or f'.spotify_cached_token_{client_id}.json'
-
-    def _get_authorization_headers(self):
-        return {'Authorization': f'Bearer {self.token}'}
-
-    def _api_call(self, method, url, request=None, **kwargs):
-        url = self._api_prefix + url
-
-        headers = self._get_authorization_headers()
-
-        response = self._session.request(method=method, url=url, headers=headers, **kwargs)
+        self.cached_token_path = cached_token_path
+        self.cache = cache
+        self.scheduler = scheduler or RequestScheduler(rate=self.rate_limit, max_retries=self.max_retries,
+                                                       timeout=self.api_call_timeout)
+        self.token_manager = token_manager or auth.TokenManager(self._create_auth())
+        # Token managers passed in may be shared with other clients, close() only stops its own.
+        self._token_managers = [] if token_manager else [self.token_manager]
+        self.coalescer = self._create_coalescer() if coalesce else None
+        self.models = models
+        self.instrumentation = instrumentation
+        self.store = store
+        self.index = index
+
+    @property
+    def transport(self):
+        # requests is the slowest import of the package, so the default transport waits for the first request.
+        if self._transport is None:
+            self._transport = self._create_transport()
+        return self._transport
+
+    def _create_transport(self):
+        return transport.RequestsTransport(max_connections=self.max_connections,
+                                           keepalive_timeout=self.keepalive_timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for token_manager in self._token_managers:
+            token_manager.stop()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _create_coalescer(self):
+        return SingleFlight()
+
+    def _create_auth(self):
+        if self.redirect_uri or self.cached_token_path:
+            return auth.SpotifyUserAuth(self.client_id, self.client_secret, self.redirect_uri, state=self.state,
+                                        scope=self.scope, cached_token_path=self.cached_token_path,
+                                        token_url=self._token_url)
+        return auth.SpotifyClientCredentialsAuth(None, self.client_id, self.client_secret,
+                                                 token_url=self._token_url)
+
+    @property
+    def token(self):
+        return self.token_manager.get_access_token()
+
+    def _get_authorization_headers(self, token):
+        return {'Authorization': f'Bearer {token["access_token"]}'}
+
+    def _cache_lookup(self, method, path, url, params, headers):
+        if self.cache is None or method != 'GET' or not self.cache.cacheable(path):
+            return None, None
+        key = self.cache.key(url, params)
+        entry = self.cache.lookup(key)
+        if entry is not None and not entry.is_fresh() and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        return key, entry
+
+    def _request(self, scheduler, method, url, headers, params, kwargs, record):
+        if record is None:
+            return self.transport.request(method, url, headers, params, scheduler.timeout, **kwargs)
+        record.attempts += 1
+        connect = record.connect
+        start = time.perf_counter()
+        response = self.transport.request(method, url, headers, params, scheduler.timeout, record, **kwargs)
+        # elapsed ends when the headers were parsed, whatever is left was spent reading the body.
+        record.wait += response.elapsed - (record.connect - connect)
+        record.download += max(0.0, time.perf_counter() - start - response.elapsed)
+        record.status = response.status_code
+        record.bytes += len(response.content)
+        return response
+
+    def _send(self, scheduler, method, url, headers, params, kwargs, record=None):
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            scheduler.wait()
+            try:
+                response = self._request(scheduler, method, url, headers, params, kwargs, record)
+            except self.transport.errors as e:
+                # Errors while connecting are safe to retry, nothing reached the API yet.
+                delay = scheduler.retry_after(attempt, idempotent=idempotent or not self.transport.sent(e))
+                if delay is None:
+                    raise
+            else:
+                if response.status_code < 400:
+                    return response
+                delay = scheduler.retry_after(attempt, response.status_code, response.headers, idempotent)
+                if delay is None:
+                    return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _api_call(self, method, url, request=None, params=None, **kwargs):
+        if self.coalescer is not None and method == 'GET' and not kwargs:
+            params = utils.clean_params(params)
+            return self.coalescer.do(request_key(method, url, params),
+                                     lambda: self._fetch(method, url, request, params, kwargs))
+        return self._fetch(method, url, request, params, kwargs)
+
+    def _fetch(self, method, url, request, params, kwargs):
+        result = self._dispatch(method, url, request, params, kwargs)
+        if self.index is not None and method == 'GET':
+            self.index.add_response(result)
+        return models.parse(result) if self.models else result
+
+    def _dispatch(self, method, url, request, params, kwargs):
+        return self._call(self.token_manager, self.scheduler, method, url, request, params, kwargs)
+
+    def _call(self, token_manager, scheduler, method, url, request, params, kwargs):
+        if self.instrumentation is None:
+            return self._perform(token_manager, scheduler, method, url, request, params, kwargs, None)
+        record = self.instrumentation.start(method, url)
+        try:
+            return self._perform(token_manager, scheduler, method, url, request, params, kwargs, record)
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.instrumentation.finish(record)
+
+    def _perform(self, token_manager, scheduler, method, url, request, params, kwargs, record):
+        path, url = url, self._api_prefix + url
+        params = utils.clean_params(params)
+
+        token = token_manager.get_token()
+        headers = self._get_authorization_headers(token)
+
+        cache_key, entry = self._cache_lookup(method, path, url, params, headers)
+        if entry is not None and entry.is_fresh():
+            if record is not None:
+                record.cached = True
+            return entry.value
+
+        response = self._send(scheduler, method, url, headers, params, kwargs, record)
+
+        if response.status_code == 401:
+            headers.update(self._get_authorization_headers(token_manager.refresh(token)))
+            response = self._send(scheduler, method, url, headers, params, kwargs, record)
+
+        if response.status_code == 304 and entry is not None:
+            if record is not None:
+                record.cached = True
+            return self.cache.revalidated(cache_key, entry, response.headers)
 
         response.raise_for_status()
 
         if response.content == b'':
-            return (f'REQUEST {request} OK!')
+            return utils.empty_response(request)
 
-        return response.json()
+        if record is None:
+            data = utils.json_loads(response.content)
+        else:
+            start = time.perf_counter()
+            data = utils.json_loads(response.content)
+            record.decode = time.perf_counter() - start
+        if cache_key is not None:
+            self.cache.store(cache_key, data, response.headers)
+        return data
 
     def _get(self, url, **kwargs):
         return self._api_call(method='GET', url=url, **kwargs)
@@ -55,15 +215,145 @@ class Spotify:
     def _delete(self, url, **kwargs):
         return self._api_call(method='DELETE', url=url, **kwargs)
 
+    def _fan_out(self, func, arg_lists):
+        if len(arg_lists) <= 1 or self.max_workers <= 1:
+            return [func(*args) for args in arg_lists]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(arg_lists))) as executor:
+            return list(executor.map(lambda args: func(*args), arg_lists))
+
+    def _sequence(self, func, arg_lists):
+        '''Call func(*args) for each of arg_lists, each call starting once the previous one returned'''
+        return [func(*args) for args in arg_lists]
+
+    def _collect(self, items):
+        '''List of the items of an iterator returned by paginate()'''
+        return list(items)
+
+    def _blocking(self, func, *args):
+        '''func(*args) for blocking I/O such as the store, AsyncSpotify runs it in a thread'''
+        return func(*args)
+
+    def _then(self, result, callback):
+        return callback(result)
+
+    def _completed(self, value):
+        '''value as this client returns results, awaitable for AsyncSpotify'''
+        return value
+
+    def _bulk_lookup(self, func, key, limit, ids, *args):
+        ids = list(ids)
+        chunks = list(utils.chunked(utils.dedupe(ids), limit))
+
+        def merge(responses):
+            found = {}
+            for chunk, response in zip(chunks, responses):
+                found.update(zip(chunk, response[key] if key else response))
+            return [found[id] for id in ids]
+
+        return self._then(self._fan_out(func, [(','.join(chunk), *args) for chunk in chunks]), merge)
+
+    def _stored_lookup(self, kind, path, limit, ids):
+        '''_bulk_lookup that answers from self.store first and writes the fetched objects back'''
+        ids = list(ids)
+        unique = utils.dedupe(ids)
+        key = path.replace('-', '_')
+
+        def fetch(chunk):
+            # Bypasses model parsing, the store keeps the objects as the API sent them.
+            return self._dispatch('GET', path, None, {'ids': ','.join(chunk)}, {})
+
+        def fetch_missing(found):
+            chunks = list(utils.chunked([id for id in unique if id not in found], limit))
+
+            def merge(responses):
+                fetched = {}
+                for chunk, response in zip(chunks, responses):
+                    fetched.update((id, obj) for id, obj in zip(chunk, response[key]) if obj is not None)
+                found.update(fetched)
+                return self._then(self._blocking(self.store.put_many, kind, fetched), lambda _: finish(found))
+
+            return self._then(self._fan_out(fetch, [(chunk,) for chunk in chunks]), merge)
+
+        def finish(found):
+            if self.index is not None:
+                self.index.add_response(list(found.values()))
+            results = [found.get(id) for id in ids]
+            return models.parse(results) if self.models else results
+
+        return self._then(self._blocking(self.store.get_many, kind, unique), fetch_missing)
+
+    def _bulk_update(self, func, limit, ids):
+        chunks = list(utils.chunked(utils.dedupe(ids), limit))
+        return self._fan_out(func, [(chunk,) for chunk in chunks])
+
+    def paginate(self, method, *args, prefetch=0, **kwargs):
+        '''Yield every item of a paged endpoint, one page at a time
+
+        method is a paged endpoint method of this client, e.g. sp.playlist_tracks.
+        With prefetch=N, up to N of the following pages of an offset-paged
+        endpoint are fetched in the background while the current one is consumed.
+        '''
+        name = method.__name__
+        key = paging.envelope_key(name, args, kwargs)
+        kwargs.setdefault('limit', paging.page_limit(name))
+        if name == 'search':
+            # An explicit offset keeps a SearchIndex from answering a first page that has no next pages.
+            kwargs.setdefault('offset', 0)
+
+        if name in paging.CURSORS:
+            yield from self._paginate_cursor(method, name, key, *args, **kwargs)
+            return
+
+        page = paging.unwrap(method(*args, **kwargs), key)
+        yield from paging.items(page)
+
+        def fetch(offset):
+            return paging.items(paging.unwrap(method(*args, **{**kwargs, 'offset': offset}), key))
+
+        offsets = paging.remaining_offsets(name, page)
+        if not prefetch:
+            for offset in offsets:
+                yield from fetch(offset)
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        pending = deque()
+        try:
+            for offset in offsets:
+                pending.append(executor.submit(fetch, offset))
+                if len(pending) > prefetch:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _paginate_cursor(self, method, name, key, *args, **kwargs):
+        cursor = paging.CURSORS[name]
+        while True:
+            page = paging.unwrap(method(*args, **kwargs), key)
+            yield from paging.items(page)
+            kwargs[cursor] = paging.next_cursor(name, page)
+            if kwargs[cursor] is None:
+                return
+
     def me(self):
         return self._get('me')
 
     def user_profile(self, user_id=None):
         if user_id is None:
-            self.me()
+            return self.me()
         return self._get(f'users/{user_id}')
 
     def search(self, q, type, market=None, limit=None, offset=None, include_external=None):
+        if self.index is not None and market is None:
+            response = self.index.answer(q, type, limit or 20, offset)
+            if response is not None:
+                return self._completed(models.parse(response) if self.models else response)
         params = {'q':q, 'type':type, 'market':market, 'limit':limit, 'offset':offset, 'include_external':include_external}
         return self._get('search', params=params)
 
@@ -120,6 +410,9 @@ class Spotify:
                   **kwargs}
         return self._get('recommendations', params=params)
 
+    def available_genre_seeds(self):
+        return self._get('recommendations/available-genre-seeds')
+
     def user_follows_artists(self, ids):
         params = {'type':'artist', 'ids':ids}
         return self._get('me/following/contains', params=params)
@@ -173,16 +466,21 @@ class Spotify:
         return self._get(f'audio-analysis/{id}')
 
     def audio_features(self, ids):
-
-        return self._get(f'audio-features', ids=ids)
+        params = {'ids':ids}
+        return self._get(f'audio-features', params=params)
 
     def tracks(self, ids, market=None):
         params = {'ids':ids, 'market':market}
         return self._get('tracks', params=params)
 
     def add_track_to_playlist(self, playlist_id, uris=None, position=None):
-        params = {'uris':uris, 'position':position}
-        return self._post(f'playlists/{playlist_id}/tracks', params=params, request='add_track_to_playlist')
+        if isinstance(uris, str):
+            uris = uris.split(',')
+        body = {"uris": uris}
+        if position is not None:
+            body['position'] = position
+        data = json.dumps(body)
+        return self._post(f'playlists/{playlist_id}/tracks', data=data, request='add_track_to_playlist')
 
     def change_playlist_details(self, playlist_id, name=None, public=None, collaborative=None, description=None):
         params = {'name':name, 'public':public, 'collaborative':collaborative, 'description':description}
@@ -198,7 +496,7 @@ class Spotify:
     def user_playlists(self, user_id=None, limit=None, offset=None):
         params = {'limit': limit, 'offset': offset}
         if user_id is None:
-            self.my_playlists(params)
+            return self.my_playlists(limit=limit, offset=offset)
         return self._get(f'users/{user_id}/playlists', params=params)
 
     def playlist_cover_image(self, playlist_id):
@@ -325,3 +623,44 @@ class Spotify:
     def transfer(self, device_ids, play=None):
         params = {'device_ids':device_ids, 'play':play}
         return self._put('me/player', params=params, request='transfer')
+
+    def bulk_tracks(self, ids, market=None):
+        if self.store is not None and market is None:
+            return self._stored_lookup('track', 'tracks', 50, ids)
+        return self._bulk_lookup(self.tracks, 'tracks', 50, ids, market)
+
+    def bulk_albums(self, ids, market=None):
+        if self.store is not None and market is None:
+            return self._stored_lookup('album', 'albums', 20, ids)
+        return self._bulk_lookup(self.albums, 'albums', 20, ids, market)
+
+    def bulk_artists(self, ids):
+        if self.store is not None:
+            return self._stored_lookup('artist', 'artists', 50, ids)
+        return self._bulk_lookup(self.artists, 'artists', 50, ids)
+
+    def bulk_audio_features(self, ids):
+        if self.store is not None:
+            return self._stored_lookup('audio_features', 'audio-features', 100, ids)
+        return self._bulk_lookup(self.audio_features, 'audio_features', 100, ids)
+
+    def audio_analysis_arrays(self, id):
+        from .analysis import AudioAnalysis
+        return self._then(self.audio_analysis(id), AudioAnalysis)
+
+    def audio_features_matrix(self, ids):
+        from .analysis import FeatureMatrix
+        ids = list(ids)
+        return self._then(self.bulk_audio_features(ids), lambda features: FeatureMatrix.from_features(ids, features))
+
+    def bulk_saved_tracks_contains(self, ids):
+        return self._bulk_lookup(self.saved_tracks_contains, None, 50, ids)
+
+    def bulk_saved_albums_contains(self, ids):
+        return self._bulk_lookup(self.saved_albums_contains, None, 20, ids)
+
+    def bulk_save_tracks(self, ids):
+        return self._bulk_update(self.save_tracks, 50, ids)
+
+    def bulk_remove_saved_tracks(self, ids):
+        return self._bulk_update(self.remove_saved_tracks, 50, ids)
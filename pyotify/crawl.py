@@ -0,0 +1,328 @@
+'''Multiprocess crawls of the catalog graph
+
+A CrawlExecutor walks related_artists -> artists_albums -> album_tracks ->
+audio_features (or any other handlers) with a pool of worker processes:
+
+    from functools import partial
+
+    crawler = CrawlExecutor(partial(Spotify, client_id, client_secret), rate=20,
+                            output='catalog.ndjson', checkpoint='crawl.json')
+    crawler.run([('artist', seed_artist_id)])
+
+The parent process owns the frontier and the visited set, so every entity
+is fetched once. Workers decode the responses, serialize the records to
+newline-delimited JSON and send them back in batches together with the
+entities they discovered. All workers share one rate limit and back off
+together on a 429.
+'''
+import os
+import json
+import time
+import multiprocessing
+from queue import Empty
+from collections import deque
+
+from .scheduler import RequestScheduler
+
+
+def crawl_artists(client, ids):
+    records, children = [], []
+    for id in ids:
+        related = [artist['id'] for artist in client.related_artists(id)['artists']]
+        albums = list(client.paginate(client.artists_albums, id, include_groups='album,single'))
+        records.append({'type': 'artist_graph', 'id': id, 'related_artists': related,
+                        'albums': [album['id'] for album in albums]})
+        records.extend(albums)
+        children.extend(('artist', artist_id) for artist_id in related)
+        children.extend(('album', album['id']) for album in albums)
+    return records, children
+
+
+def crawl_albums(client, ids):
+    records, children = [], []
+    for id in ids:
+        for track in client.paginate(client.album_tracks, id):
+            track['album_id'] = id
+            records.append(track)
+            children.append(('track', track['id']))
+    return records, children
+
+
+def crawl_tracks(client, ids):
+    return [features for features in client.bulk_audio_features(ids) if features is not None], []
+
+
+HANDLERS = {'artist': crawl_artists, 'album': crawl_albums, 'track': crawl_tracks}
+BATCH_SIZES = {'artist': 5, 'album': 10, 'track': 100}
+
+
+class SharedTokenBucket:
+    '''TokenBucket whose state lives in shared memory, so it limits all processes together'''
+
+    def __init__(self, rate, capacity=None, context=multiprocessing):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._lock = context.Lock()
+        self._tokens = context.RawValue('d', self.capacity)
+        self._updated = context.RawValue('d', time.monotonic())
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self._tokens.value + (now - self._updated.value) * self.rate) - 1
+            self._tokens.value = tokens
+            self._updated.value = now
+            return 0 if tokens >= 0 else -tokens / self.rate
+
+
+class SharedScheduler(RequestScheduler):
+    '''RequestScheduler sharing its rate limit and 429 pauses with the other crawl workers'''
+
+    def __init__(self, bucket, paused_until, **kwargs):
+        self._paused_until = paused_until
+        super().__init__(**kwargs)
+        self.bucket = bucket
+
+    @property
+    def paused_until(self):
+        return self._paused_until.value
+
+    @paused_until.setter
+    def paused_until(self, value):
+        with self._paused_until.get_lock():
+            self._paused_until.value = max(self._paused_until.value, value)
+
+
+def _worker(client_factory, handlers, tasks, results, bucket, paused_until):
+    client = client_factory()
+    client.scheduler = SharedScheduler(bucket, paused_until, max_retries=client.max_retries,
+                                       timeout=client.api_call_timeout)
+    sent = set()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        batch_id, kind, ids = task
+        try:
+            records, children = handlers[kind](client, ids)
+        except Exception as e:
+            results.put((batch_id, b'', [], repr(e)))
+            continue
+        payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode('utf-8')
+        # Children this worker already reported are in the parent's visited set.
+        new_children = [child for child in dict.fromkeys(children) if child not in sent]
+        sent.update(new_children)
+        results.put((batch_id, payload, new_children, None))
+
+
+class _Worker:
+    __slots__ = ('process', 'tasks', 'batches')
+
+    def __init__(self, process, tasks):
+        self.process = process
+        self.tasks = tasks
+        self.batches = set()
+
+
+class CrawlError(Exception):
+    pass
+
+
+class CrawlExecutor:
+    '''Crawls the catalog graph with a pool of worker processes
+
+    client_factory is a picklable callable returning a Spotify client
+    without models, e.g. functools.partial(Spotify, client_id,
+    client_secret). handlers maps an entity kind to a function
+    handler(client, ids) returning (records, children), where children are
+    (kind, id) pairs still to crawl. batch_sizes sets how many IDs of each
+    kind go to a worker at once.
+
+    Records are appended to output as newline-delimited JSON, or passed to
+    sink(payload) as bytes. With checkpoint, the frontier, the visited set
+    and the output size are written to that file every checkpoint_interval
+    seconds, and run() resumes from it. A resumed crawl truncates output to
+    the checkpointed size, so no record is written twice.
+
+    The batches of a worker that dies are crawled again by the others.
+    run() raises CrawlError once no worker is left, e.g. when
+    client_factory fails.
+    '''
+    poll_interval = 1
+
+    def __init__(self, client_factory, handlers=None, batch_sizes=None, processes=None, rate=None,
+                 output=None, sink=None, checkpoint=None, checkpoint_interval=30, limit=None, context=None):
+        self.client_factory = client_factory
+        self.handlers = handlers or HANDLERS
+        self.batch_sizes = {**BATCH_SIZES, **(batch_sizes or {})}
+        self.processes = processes or os.cpu_count() or 1
+        self.rate = rate
+        self.output = output
+        self.sink = sink
+        self.checkpoint_path = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.limit = limit
+        self.context = multiprocessing.get_context(context)
+        self.visited = set()
+        self.frontier = {kind: deque() for kind in self.handlers}
+        self.stats = {'batches': 0, 'records': 0, 'bytes': 0, 'errors': 0}
+        self.errors = []
+        self._batch_id = 0
+
+    def add(self, kind, id):
+        key = f'{kind}:{id}'
+        if key in self.visited or kind not in self.handlers:
+            return False
+        if self.limit is not None and len(self.visited) >= self.limit:
+            return False
+        self.visited.add(key)
+        self.frontier[kind].append(id)
+        return True
+
+    def _next_batch(self):
+        # Finish the deepest kinds first, which keeps the frontier small.
+        for kind in reversed(list(self.handlers)):
+            queue = self.frontier[kind]
+            if queue:
+                return kind, [queue.popleft() for _ in range(min(len(queue), self.batch_sizes.get(kind, 1)))]
+        return None
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.visited = set(state['visited'])
+        self.frontier = {kind: deque(state['frontier'].get(kind, ())) for kind in self.handlers}
+        self.stats = state['stats']
+        self.errors = state['errors']
+        if self.output and os.path.exists(self.output):
+            with open(self.output, 'ab') as f:
+                f.truncate(state['output_size'])
+        return True
+
+    def save_checkpoint(self, pending=(), output_size=0):
+        frontier = {kind: list(queue) for kind, queue in self.frontier.items()}
+        # Batches still in flight are crawled again after a resume.
+        for kind, ids in pending:
+            frontier[kind][:0] = ids
+        state = {'visited': list(self.visited), 'frontier': frontier, 'stats': self.stats,
+                 'errors': self.errors, 'output_size': output_size}
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self, seeds=()):
+        '''Crawl from seeds, (kind, id) pairs, plus any checkpointed frontier and return the stats'''
+        if self.checkpoint_path:
+            self.load_checkpoint()
+        for kind, id in seeds:
+            self.add(kind, id)
+
+        results = self.context.Queue()
+        workers = self._start_workers(results)
+        output = open(self.output, 'ab') if self.output else None
+        pending = {}
+        last_checkpoint = time.monotonic()
+        try:
+            while self._assign(workers, pending):
+                try:
+                    result = results.get(timeout=self.poll_interval)
+                except Empty:
+                    self._reap(workers, pending)
+                    continue
+                self._collect(result, workers, pending, output)
+                if self.checkpoint_path and time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(pending, output)
+                    last_checkpoint = time.monotonic()
+        finally:
+            self._stop_workers(workers)
+            if self.checkpoint_path:
+                self._checkpoint(pending, output)
+            if output is not None:
+                output.close()
+        return self.stats
+
+    def _start_workers(self, results):
+        bucket = SharedTokenBucket(self.rate, context=self.context) if self.rate else None
+        paused_until = self.context.Value('d', 0.0)
+        workers = []
+        for _ in range(self.processes):
+            tasks = self.context.Queue()
+            process = self.context.Process(target=_worker, daemon=True,
+                                           args=(self.client_factory, self.handlers, tasks, results, bucket,
+                                                 paused_until))
+            process.start()
+            workers.append(_Worker(process, tasks))
+        return workers
+
+    def _assign(self, workers, pending):
+        '''Give each live worker up to two batches, False once nothing is left to crawl'''
+        for worker in workers:
+            while len(worker.batches) < 2 and worker.process.is_alive():
+                batch = self._next_batch()
+                if batch is None:
+                    return bool(pending)
+                self._batch_id += 1
+                pending[self._batch_id] = batch
+                worker.batches.add(self._batch_id)
+                worker.tasks.put((self._batch_id, *batch))
+        if not pending and any(self.frontier.values()):
+            # No live worker took the remaining work.
+            self._reap(workers, pending)
+        return bool(pending)
+
+    def _collect(self, result, workers, pending, output):
+        done, payload, children, error = result
+        for worker in workers:
+            worker.batches.discard(done)
+        if done not in pending:
+            # The batch of a worker that died after sending it, it was already given to another worker.
+            return
+        kind, ids = pending[done]
+        self.stats['batches'] += 1
+        if error is not None:
+            self.stats['errors'] += 1
+            self.errors.append({'kind': kind, 'ids': ids, 'error': error})
+        for child_kind, child_id in children:
+            self.add(child_kind, child_id)
+        if payload:
+            if self.sink is not None:
+                self.sink(payload)
+            if output is not None:
+                output.write(payload)
+            self.stats['records'] += payload.count(b'\n')
+            self.stats['bytes'] += len(payload)
+        # Only now is the batch done, an interruption before this crawls it again after a resume.
+        del pending[done]
+
+    def _reap(self, workers, pending):
+        '''Put the batches of dead workers back in the frontier, raise CrawlError if all of them died'''
+        for worker in workers:
+            if worker.process.is_alive() or not worker.batches:
+                continue
+            for batch_id in worker.batches:
+                kind, ids = pending.pop(batch_id)
+                self.frontier[kind].extendleft(reversed(ids))
+            worker.batches.clear()
+        if not any(worker.process.is_alive() for worker in workers):
+            codes = sorted({worker.process.exitcode for worker in workers})
+            raise CrawlError(f'every crawl worker exited (exit codes {codes}), see their output for the cause')
+
+    def _stop_workers(self, workers):
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.tasks.put(None)
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def _checkpoint(self, pending, output):
+        output_size = 0
+        if output is not None:
+            output.flush()
+            output_size = output.tell()
+        self.save_checkpoint(pending.values(), output_size)
@@ -0,0 +1,282 @@
+'''Batched playlist editing
+
+A PlaylistEditor records edits (or a desired end state) locally and turns
+them into as few add, remove and reorder requests as it can, chaining the
+snapshot_id of each response into the next request.
+'''
+import json
+from collections import Counter
+
+from .paging import field
+
+MAX_ITEMS = 100
+
+
+def to_uri(id):
+    return id if id.startswith('spotify:') else f'spotify:track:{id}'
+
+
+class Operation:
+    __slots__ = ('method', 'body')
+
+    def __init__(self, method, body):
+        self.method = method
+        self.body = body
+
+    def __repr__(self):
+        return f'Operation({self.method!r}, {self.body!r})'
+
+
+def _longest_increasing(values):
+    '''Indices of a longest strictly increasing subsequence of values'''
+    tails, tails_index, previous = [], [], [None] * len(values)
+    for i, value in enumerate(values):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(tails):
+            tails.append(value)
+            tails_index.append(i)
+        else:
+            tails[lo] = value
+            tails_index[lo] = i
+        previous[i] = tails_index[lo - 1] if lo else None
+    result = []
+    i = tails_index[-1] if tails_index else None
+    while i is not None:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+
+def _occurrences(uris):
+    '''Tag each uri with its occurrence number so duplicates can be told apart'''
+    seen = Counter()
+    tokens = []
+    for uri in uris:
+        tokens.append((uri, seen[uri]))
+        seen[uri] += 1
+    return tokens
+
+
+def _removals(current, target, state, target_set):
+    '''DELETE operations for everything in state that target does not keep, and the state after them'''
+    operations = []
+    # Tracks missing from target entirely are removed by uri, other surplus occurrences by position.
+    target_counts = Counter(target)
+    gone = [uri for uri in dict.fromkeys(current) if uri not in target_counts and uri is not None]
+    for start in range(0, len(gone), MAX_ITEMS):
+        operations.append(Operation('DELETE', {'tracks': [{'uri': uri} for uri in gone[start:start + MAX_ITEMS]]}))
+    gone = set(gone)
+    state = [token for token in state if token[0] not in gone]
+
+    # Highest positions go first, so a batch never shifts the positions of the batches after it.
+    surplus = [(position, token) for position, token in enumerate(state) if token not in target_set][::-1]
+    for start in range(0, len(surplus), MAX_ITEMS):
+        positions = {}
+        for position, (uri, _) in surplus[start:start + MAX_ITEMS]:
+            positions.setdefault(uri, []).append(position)
+        operations.append(Operation('DELETE', {'tracks': [{'uri': uri, 'positions': sorted(p)}
+                                                          for uri, p in positions.items()]}))
+    return operations, [token for token in state if token in target_set]
+
+
+def _moves(state, target_tokens):
+    '''Reorder operations that sort state into the order of target_tokens, state is updated in place'''
+    operations = []
+    # Keep the longest run of tracks already in target order in place and move the rest.
+    kept = set(state)
+    order = [token for token in target_tokens if token in kept]
+    rank = {token: i for i, token in enumerate(order)}
+    in_place = {state[i] for i in _longest_increasing([rank[token] for token in state])}
+    j = 0
+    while j < len(order):
+        if order[j] in in_place:
+            j += 1
+            continue
+        range_start = state.index(order[j])
+        length = _run_length(state, order, in_place, j, range_start)
+        insert_before = state.index(order[j - 1]) + 1 if j else 0
+        moved = state[range_start:range_start + length]
+        del state[range_start:range_start + length]
+        destination = insert_before if insert_before < range_start else insert_before - length
+        state[destination:destination] = moved
+        if destination != range_start:
+            operations.append(Operation('PUT', {'range_start': range_start, 'insert_before': insert_before,
+                                                'range_length': length}))
+        in_place.update(moved)
+        j += length
+    return operations
+
+
+def _run_length(state, order, in_place, j, range_start):
+    '''How many tracks from order[j] on are out of place and already adjacent in state'''
+    length = 1
+    while j + length < len(order) and order[j + length] not in in_place:
+        if range_start + length >= len(state) or state[range_start + length] != order[j + length]:
+            break
+        length += 1
+    return length
+
+
+def _insertions(target, target_tokens, kept):
+    '''Insert the new tracks, one request per contiguous run of at most MAX_ITEMS'''
+    operations = []
+    position = 0
+    while position < len(target_tokens):
+        if target_tokens[position] in kept:
+            position += 1
+            continue
+        run = position
+        while run < len(target_tokens) and target_tokens[run] not in kept and run - position < MAX_ITEMS:
+            run += 1
+        operations.append(Operation('POST', {'uris': target[position:run], 'position': position}))
+        position = run
+    return operations
+
+
+def _keep_unavailable(uris, target):
+    '''target with the unavailable items (None) of uris at about their positions'''
+    target = list(target)
+    for position, uri in enumerate(uris):
+        if uri is None:
+            target.insert(min(position, len(target)), None)
+    return target
+
+
+def plan_changes(current, target, allow_rewrite=False):
+    '''Return the Operations that turn the uri list current into target
+
+    None stands for an unavailable item without a uri. The API can only
+    move those, so target must hold as many of them as current. With
+    allow_rewrite, the playlist may be replaced wholesale when that takes
+    fewer requests, which resets the added_at date of every item.
+    '''
+    if current.count(None) != target.count(None):
+        raise ValueError('unavailable items (None) can be moved but not added or removed')
+    target_tokens = _occurrences(target)
+    operations, state = _removals(current, target, _occurrences(current), set(target_tokens))
+    kept = set(state)
+    operations += _moves(state, target_tokens)
+    operations += _insertions(target, target_tokens, kept)
+
+    if allow_rewrite and None not in target:
+        rewrite = [Operation('PUT', {'uris': target[:MAX_ITEMS]})]
+        rewrite += [Operation('POST', {'uris': target[start:start + MAX_ITEMS]})
+                    for start in range(MAX_ITEMS, len(target), MAX_ITEMS)]
+        if len(rewrite) < len(operations):
+            return rewrite
+    return operations
+
+
+class PlaylistEditor:
+    '''Collects edits of one playlist and applies them in few requests
+
+        editor = PlaylistEditor(sp, playlist_id)
+        editor.remove(old_ids)
+        editor.add(new_ids, position=0)
+        editor.apply()
+
+    set(uris) replaces the whole contents instead, keeping unavailable items
+    (null tracks) where they are since they cannot be removed. With
+    allow_rewrite, the editor may replace the playlist wholesale when that
+    takes fewer requests, which resets the added_at date of every item and
+    so breaks Sync.sync_saved_tracks() style consumers of added_at.
+
+    Works with Spotify and AsyncSpotify clients; with AsyncSpotify, load(),
+    target(), plan() and apply() return awaitables.
+    '''
+    item_fields = 'items(track(uri)),total,limit,offset,next'
+
+    def __init__(self, client, playlist_id, allow_rewrite=False):
+        self.client = client
+        self.playlist_id = playlist_id
+        self.allow_rewrite = allow_rewrite
+        self.snapshot_id = None
+        self._current = None
+        self._edits = []
+
+    def add(self, uris, position=None):
+        self._edits.append(('add', [to_uri(uri) for uri in uris], position))
+        return self
+
+    def remove(self, uris):
+        self._edits.append(('remove', {to_uri(uri) for uri in uris}))
+        return self
+
+    def move(self, range_start, insert_before, range_length=1):
+        self._edits.append(('move', range_start, insert_before, range_length))
+        return self
+
+    def set(self, uris):
+        self._edits.append(('set', [to_uri(uri) for uri in uris]))
+        return self
+
+    def load(self):
+        '''Fetch the snapshot_id and the uris of the playlist, None for unavailable items'''
+        def store(items):
+            self._current = [field(field(item, 'track'), 'uri') if field(item, 'track') else None for item in items]
+            return self._current
+
+        def fetch_items(response):
+            self.snapshot_id = field(response, 'snapshot_id')
+            items = self.client.paginate(self.client.playlist_tracks, self.playlist_id, fields=self.item_fields,
+                                         prefetch=4)
+            return self.client._then(self.client._collect(items), store)
+
+        return self.client._then(self.client.playlist(self.playlist_id, fields='snapshot_id'), fetch_items)
+
+    def _loaded(self):
+        return self.client._completed(self._current) if self._current is not None else self.load()
+
+    def target(self):
+        return self.client._then(self._loaded(), self._target)
+
+    def _target(self, current):
+        uris = list(current)
+        for edit in self._edits:
+            if edit[0] == 'add':
+                position = len(uris) if edit[2] is None else edit[2]
+                uris[position:position] = edit[1]
+            elif edit[0] == 'remove':
+                uris = [uri for uri in uris if uri not in edit[1]]
+            elif edit[0] == 'move':
+                _, range_start, insert_before, range_length = edit
+                moved = uris[range_start:range_start + range_length]
+                del uris[range_start:range_start + range_length]
+                destination = insert_before if insert_before < range_start else insert_before - range_length
+                uris[destination:destination] = moved
+            else:
+                uris = _keep_unavailable(uris, edit[1])
+        return uris
+
+    def plan(self):
+        return self.client._then(self._loaded(), lambda current: plan_changes(
+            current, self._target(current), allow_rewrite=self.allow_rewrite))
+
+    def apply(self):
+        '''Send the planned requests in order and return the final snapshot_id'''
+        return self.client._then(self.plan(), self._send)
+
+    def _send(self, operations):
+        url = f'playlists/{self.playlist_id}/tracks'
+
+        def stored(response):
+            self.snapshot_id = field(response, 'snapshot_id')
+
+        def send(operation):
+            body = dict(operation.body)
+            if self.snapshot_id and 'uris' not in body:
+                body['snapshot_id'] = self.snapshot_id
+            return self.client._then(self.client._api_call(operation.method, url, data=json.dumps(body)), stored)
+
+        def done(_):
+            self._current = None
+            self._edits = []
+            return self.snapshot_id
+
+        return self.client._then(self.client._sequence(send, [(operation,) for operation in operations]), done)
@@ -0,0 +1,304 @@
+'''Local search index over the catalog objects a client has fetched
+
+    index = SearchIndex()
+    sp = Spotify(client_id, client_secret, index=index)
+    sp.bulk_tracks(track_ids)                               # fills the index
+    sp.search('artist:"daft punk" one more time', 'track')   # answered locally
+
+Names are normalized (case, accents, punctuation) and matched token by
+token, with trigram similarity for misspelled tokens. Queries support the
+artist:, track:, album:, genre:, year: (1999 or 1990-1999) and isrc:
+filters of the Web API search syntax.
+'''
+import re
+import math
+import threading
+import unicodedata
+
+TYPES = ('track', 'album', 'artist')
+FILTERS = ('artist', 'track', 'album', 'genre', 'year', 'isrc')
+
+_apostrophes_re = re.compile(r"['’`]")
+_non_word_re = re.compile(r'[\W_]+')
+_filter_re = re.compile(r'(\w+):(?:"([^"]*)"|(\S+))')
+
+
+def normalize(text):
+    '''Lowercase tokens of text without accents and punctuation'''
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _apostrophes_re.sub('', text.replace('&', ' and '))
+    return _non_word_re.sub(' ', text).split()
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def parse_query(q):
+    '''Split a search query into free text tokens and {filter: value}'''
+    filters = {}
+
+    def take(match):
+        filters[match.group(1).lower()] = match.group(2) if match.group(2) is not None else match.group(3)
+        return ' '
+
+    text = _filter_re.sub(take, q)
+    return normalize(text), filters
+
+
+def _f1(recall, precision):
+    return 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+
+
+def _year(date):
+    try:
+        return int(date[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+def _year_range(value):
+    start, _, end = value.partition('-')
+    try:
+        return int(start), int(end or start)
+    except ValueError:
+        return None
+
+
+class _Doc:
+    __slots__ = ('key', 'type', 'obj', 'fields', 'text', 'year')
+
+    def __init__(self, obj):
+        self.key = (obj['type'], obj['id'])
+        self.type = obj['type']
+        self.obj = obj
+        artists = obj.get('artists') or []
+        album = obj.get('album') or {}
+        self.fields = {
+            'name': tuple(normalize(obj.get('name') or '')),
+            'artist': tuple(normalize(' '.join(a.get('name') or '' for a in artists)))
+            if self.type != 'artist' else tuple(normalize(obj.get('name') or '')),
+            'album': tuple(normalize(album.get('name') or '')) if self.type == 'track' else
+            tuple(normalize(obj.get('name') or '')) if self.type == 'album' else (),
+            'genre': tuple(normalize(' '.join(obj.get('genres') or ()))),
+        }
+        # What free text is compared with: the name, plus the artists of tracks and albums.
+        self.text = self.fields['name'] + (self.fields['artist'] if self.type != 'artist' else ())
+        self.year = _year(album.get('release_date') if self.type == 'track' else obj.get('release_date'))
+
+
+class SearchIndex:
+    '''Inverted index of tracks, albums and artists with fuzzy token matching
+
+    search() ranks matches by a confidence between 0 and 1. answer() builds
+    a Web API style search response when the best match of every requested
+    type reaches min_confidence, and returns None otherwise. Tokens that
+    are not in the index match indexed tokens whose trigram similarity is
+    at least fuzzy_threshold.
+    '''
+
+    def __init__(self, min_confidence=0.8, fuzzy_threshold=0.5, max_expansions=3):
+        self.min_confidence = min_confidence
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_expansions = max_expansions
+        self.hits = 0
+        self.misses = 0
+        self._docs = {}
+        self._postings = {}
+        self._grams = {}
+        self._isrc = {}
+        self._expansions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, obj):
+        '''Index one track, album or artist object, keeping the most complete version of each'''
+        if obj.get('type') not in TYPES or not obj.get('id'):
+            return
+        key = (obj['type'], obj['id'])
+        with self._lock:
+            old = self._docs.get(key)
+            if old is not None and len(old.obj) >= len(obj):
+                return
+            doc = _Doc(obj)
+            self._docs[key] = doc
+            for field in doc.fields.values():
+                for token in field:
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = set()
+                        for gram in trigrams(token):
+                            self._grams.setdefault(gram, set()).add(token)
+                        self._expansions.clear()
+                    postings.add(key)
+            isrc = (obj.get('external_ids') or {}).get('isrc')
+            if isrc:
+                self._isrc[isrc.upper()] = key
+
+    def add_response(self, data):
+        '''Index every track, album and artist object found in a decoded response'''
+        stack = [data]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, dict):
+                if value.get('type') in TYPES:
+                    self.add(value)
+                stack.extend(v for v in value.values() if isinstance(v, (dict, list)))
+            elif isinstance(value, list):
+                stack.extend(v for v in value if isinstance(v, (dict, list)))
+
+    def _expand(self, token):
+        '''Indexed tokens similar to token as [(token, similarity)]'''
+        expansions = self._expansions.get(token)
+        if expansions is not None:
+            return expansions
+        if token in self._postings:
+            expansions = [(token, 1.0)]
+        else:
+            grams = trigrams(token)
+            overlaps = {}
+            for gram in grams:
+                for candidate in self._grams.get(gram, ()):
+                    overlaps[candidate] = overlaps.get(candidate, 0) + 1
+            scored = []
+            for candidate, overlap in overlaps.items():
+                similarity = overlap / (len(grams) + len(trigrams(candidate)) - overlap)
+                if similarity >= self.fuzzy_threshold:
+                    scored.append((candidate, similarity))
+            expansions = sorted(scored, key=lambda item: -item[1])[:self.max_expansions]
+        if len(self._expansions) > 100000:
+            self._expansions.clear()
+        self._expansions[token] = expansions
+        return expansions
+
+    def _coverage(self, tokens, field):
+        '''How well the tokens of field cover tokens, from 0 to 1'''
+        if not tokens:
+            return 1.0
+        if not field:
+            return 0.0
+        total = 0.0
+        for token in tokens:
+            if token in field:
+                total += 1
+            else:
+                total += max((similarity for candidate, similarity in self._expand(token) if candidate in field),
+                             default=0.0)
+        return total / len(tokens)
+
+    def _candidates(self, tokens, min_coverage):
+        '''Keys of the documents that can match at least min_coverage of tokens
+
+        Such a document contains one of the len(tokens) - ceil(min_coverage *
+        len(tokens)) + 1 rarest tokens, so only their postings are read.
+        '''
+        tokens = list(dict.fromkeys(tokens))
+        postings = []
+        for token in tokens:
+            lists = [self._postings[candidate] for candidate, _ in self._expand(token)]
+            postings.append((sum(map(len, lists)), lists))
+        postings.sort(key=lambda item: item[0])
+        needed = max(1, len(tokens) - math.ceil(min_coverage * len(tokens) - 1e-9) + 1)
+        keys = set()
+        for _, lists in postings[:needed]:
+            for keys_of_token in lists:
+                keys.update(keys_of_token)
+        return keys
+
+    def _filter_score(self, doc, filters):
+        '''Product of the matches of doc with filters, a list of (name, normalized value)'''
+        score = 1.0
+        for name, value in filters:
+            if name == 'year':
+                if value is None or doc.year is None or not value[0] <= doc.year <= value[1]:
+                    return 0.0
+            elif name == 'isrc':
+                if self._isrc.get(value) != doc.key:
+                    return 0.0
+            else:
+                field = doc.fields['name'] if name == doc.type else doc.fields[name]
+                coverage = self._coverage(value, field)
+                if coverage < self.fuzzy_threshold:
+                    return 0.0
+                # Extra tokens in the field lower the score, "daft" is a weaker match for "daft punk" than "daft punk".
+                score *= _f1(coverage, min(1.0, coverage * len(value) / len(field)))
+        return score
+
+    def _select(self, tokens, filters, min_recall):
+        '''Keys of the documents that can match tokens and the normalized filters'''
+        filters = dict(filters)
+        if 'isrc' in filters:
+            key = self._isrc.get(filters['isrc'])
+            return {key} if key else set()
+        sources = [(value, self.fuzzy_threshold) for name, value in filters.items() if name != 'year']
+        if tokens:
+            sources.append((tokens, min_recall))
+        if not sources:
+            return set()
+        candidates = None
+        for source_tokens, min_coverage in sources:
+            keys = self._candidates(source_tokens, min_coverage)
+            candidates = keys if candidates is None else candidates & keys
+        return candidates
+
+    def search(self, q, type='track', limit=20, min_confidence=0.0):
+        '''Matches of q as [(confidence, object)], best first, or None if q uses unsupported filters'''
+        tokens, filters = parse_query(q)
+        if any(name not in FILTERS for name in filters):
+            return None
+        types = set(type.split(',')) if isinstance(type, str) else set(type)
+        # F1 >= c needs a recall of at least c / (2 - c).
+        min_recall = min_confidence / (2 - min_confidence)
+
+        # Filters are normalized once and the cheap year and isrc checks run first.
+        parsed = [(name, _year_range(value) if name == 'year' else value.upper() if name == 'isrc' else
+                   normalize(value)) for name, value in filters.items()]
+        parsed.sort(key=lambda item: item[0] not in ('year', 'isrc'))
+
+        with self._lock:
+            results = []
+            for key in self._select(tokens, parsed, min_recall):
+                if key[0] not in types:
+                    continue
+                doc = self._docs[key]
+                confidence = 1.0
+                if tokens:
+                    recall = self._coverage(tokens, doc.text)
+                    confidence = _f1(recall, min(1.0, recall * len(tokens) / len(doc.text)) if doc.text else 0.0)
+                if confidence >= min_confidence:
+                    confidence *= self._filter_score(doc, parsed)
+                if confidence > 0 and confidence >= min_confidence:
+                    results.append((confidence, doc.obj))
+        results.sort(key=lambda item: -item[0])
+        return results[:limit]
+
+    def answer(self, q, type, limit=20, offset=None):
+        '''A search response for q built from the index, or None when the API has to answer
+
+        Only the caller that passes no offset, and so cannot page, is answered:
+        the response holds the local matches alone, its total counts just
+        those and next is None. With an offset, even 0, the API answers so
+        the pages add up.
+        '''
+        if offset is not None:
+            return None
+        types = type.split(',')
+        response = {}
+        for kind in types:
+            results = self.search(q, kind, limit, self.min_confidence)
+            if not results or results[0][0] < self.min_confidence:
+                self.misses += 1
+                return None
+            items = [obj for confidence, obj in results]
+            response[f'{kind}s'] = {'href': None, 'items': items, 'limit': limit, 'offset': 0, 'total': len(items),
+                                    'next': None, 'previous': None}
+        self.hits += 1
+        return response
+
+    def stats(self):
+        return {'documents': len(self._docs), 'tokens': len(self._postings), 'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,220 @@
+'''Request instrumentation and per-endpoint metrics
+
+Pass an Instrumentation to a client to see every API call:
+
+    metrics = Metrics()
+    sp = Spotify(client_id, client_secret, instrumentation=metrics)
+    ...
+    print(metrics.to_prometheus())
+
+Without one, the client skips all of this.
+'''
+import time
+import threading
+
+ID_PARENTS = frozenset(('albums', 'artists', 'tracks', 'playlists', 'users', 'audio-analysis', 'audio-features',
+                        'categories', 'episodes', 'shows'))
+LITERALS = frozenset(('contains',))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASES = ('queue', 'connect', 'wait', 'download', 'decode')
+
+
+def template_path(path):
+    '''Replace the IDs in an API path with {id}, e.g. playlists/{id}/tracks'''
+    segments = path.split('/')
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_PARENTS and segments[i] not in LITERALS:
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+
+class RequestRecord:
+    '''What happened during one API call
+
+    Times are in seconds and add up to total:
+    queue is spent in the client before a request goes out (token refresh,
+    rate limiting, retry backoff, the concurrency limit), connect in opening
+    connections, wait until the response headers arrive, download reading
+    the body and decode parsing the JSON. The requests based client cannot
+    see connection setup, so its connect time is part of wait.
+    '''
+    __slots__ = ('method', 'endpoint', 'path', 'status', 'attempts', 'bytes', 'cached', 'error',
+                 'started', 'connect', 'wait', 'download', 'decode', 'total')
+
+    def __init__(self, method, path):
+        self.method = method
+        self.endpoint = template_path(path)
+        self.path = path
+        self.status = None
+        self.attempts = 0
+        self.bytes = 0
+        self.cached = False
+        self.error = None
+        self.started = time.perf_counter()
+        self.connect = 0.0
+        self.wait = 0.0
+        self.download = 0.0
+        self.decode = 0.0
+        self.total = 0.0
+
+    @property
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    @property
+    def queue(self):
+        return max(0.0, self.total - self.connect - self.wait - self.download - self.decode)
+
+    def __repr__(self):
+        return (f'RequestRecord({self.method} {self.endpoint}, status={self.status}, '
+                f'attempts={self.attempts}, total={self.total:.4f})')
+
+
+class Instrumentation:
+    '''Hooks run around every API call
+
+    before(record) runs before the call and after(record) once it finished
+    or failed. Subclasses can override before_request and after_request
+    instead.
+    '''
+
+    def __init__(self, before=None, after=None):
+        self.before = before
+        self.after = after
+
+    def start(self, method, path):
+        record = RequestRecord(method, path)
+        self.before_request(record)
+        return record
+
+    def finish(self, record):
+        record.total = time.perf_counter() - record.started
+        self.after_request(record)
+
+    def before_request(self, record):
+        if self.before is not None:
+            self.before(record)
+
+    def after_request(self, record):
+        if self.after is not None:
+            self.after(record)
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'errors', 'cached', 'retries', 'bytes', 'seconds', 'phases', 'buckets', 'statuses')
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = 0
+        self.cached = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.buckets = [0] * len(buckets)
+        self.statuses = {}
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Metrics(Instrumentation):
+    '''Counters and latency histograms per method and templated endpoint
+
+    snapshot() returns them as a dict, to_prometheus() in the Prometheus
+    text format and percentile() estimates latency percentiles from the
+    histograms. after(record) still runs for every call, after the record
+    was counted, so it can forward records elsewhere.
+    '''
+
+    def __init__(self, buckets=BUCKETS, before=None, after=None):
+        super().__init__(before=before, after=after)
+        self.buckets = tuple(sorted(buckets))
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def after_request(self, record):
+        with self._lock:
+            stats = self._endpoints.get((record.method, record.endpoint))
+            if stats is None:
+                stats = self._endpoints[(record.method, record.endpoint)] = EndpointStats(self.buckets)
+            stats.requests += 1
+            stats.errors += record.error is not None
+            stats.cached += record.cached
+            stats.retries += record.retries
+            stats.bytes += record.bytes
+            stats.seconds += record.total
+            for phase in PHASES:
+                stats.phases[phase] += getattr(record, phase)
+            for i, bound in enumerate(self.buckets):
+                if record.total <= bound:
+                    stats.buckets[i] += 1
+            if record.status is not None:
+                stats.statuses[record.status] = stats.statuses.get(record.status, 0) + 1
+        super().after_request(record)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {f'{method} {endpoint}': stats.as_dict() for (method, endpoint), stats in self._endpoints.items()}
+
+    def percentile(self, endpoint, percent):
+        '''Estimated latency percentile of endpoint, e.g. 'GET playlists/{id}/tracks', in seconds
+
+        Interpolates inside the histogram bucket that holds it, as Prometheus
+        histogram_quantile() does. None if the endpoint saw no calls, the
+        largest bucket bound if the percentile lies beyond it.
+        '''
+        method, path = endpoint.split(' ', 1)
+        with self._lock:
+            stats = self._endpoints.get((method, path))
+            if stats is None:
+                return None
+            rank = stats.requests * percent / 100
+            lower, below = 0.0, 0
+            for bound, count in zip(self.buckets, stats.buckets):
+                if count >= rank and count > below:
+                    return lower + (bound - lower) * (rank - below) / (count - below)
+                lower, below = bound, count
+            return self.buckets[-1]
+
+    def to_prometheus(self, prefix='pyotify'):
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def family(name, kind, help, samples):
+                lines.append(f'# HELP {prefix}_{name} {help}')
+                lines.append(f'# TYPE {prefix}_{name} {kind}')
+                for suffix, labels, value in samples:
+                    labels = ','.join(f'{key}="{value}"' for key, value in labels)
+                    lines.append(f'{prefix}_{name}{suffix}{{{labels}}} {value}')
+
+            def samples(get):
+                return [('', (('method', method), ('endpoint', endpoint)), get(stats))
+                        for (method, endpoint), stats in endpoints]
+
+            family('requests_total', 'counter', 'API calls by response status.',
+                   [('', (('method', method), ('endpoint', endpoint), ('status', status)), count)
+                    for (method, endpoint), stats in endpoints for status, count in sorted(stats.statuses.items())])
+            family('errors_total', 'counter', 'API calls that raised.', samples(lambda s: s.errors))
+            family('cache_hits_total', 'counter', 'API calls answered from the cache.', samples(lambda s: s.cached))
+            family('retries_total', 'counter', 'Requests sent again after a failure.', samples(lambda s: s.retries))
+            family('response_bytes_total', 'counter', 'Response body bytes received.', samples(lambda s: s.bytes))
+            family('phase_seconds_total', 'counter', 'Time spent per phase of the API calls.',
+                   [('', (('method', method), ('endpoint', endpoint), ('phase', phase)), f'{stats.phases[phase]:.6f}')
+                    for (method, endpoint), stats in endpoints for phase in PHASES])
+
+            histogram = []
+            for (method, endpoint), stats in endpoints:
+                labels = (('method', method), ('endpoint', endpoint))
+                for bound, count in zip(self.buckets, stats.buckets):
+                    histogram.append(('_bucket', labels + (('le', f'{bound:g}'),), count))
+                histogram.append(('_bucket', labels + (('le', '+Inf'),), stats.requests))
+                histogram.append(('_sum', labels, f'{stats.seconds:.6f}'))
+                histogram.append(('_count', labels, stats.requests))
+            family('request_seconds', 'histogram', 'Latency of API calls.', histogram)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,105 @@
+'''Compact typed response models
+
+Models keep the scalar fields of an object in __slots__ and drop the
+rest of the response (available_markets, external_urls, ...). Nested
+objects stay as they came off the wire until they are first accessed.
+'''
+
+
+class Model:
+    __slots__ = ('_raw',)
+    _fields = ()
+    _nested = {}
+
+    def __init__(self, data):
+        for name in self._fields:
+            setattr(self, name, data.get(name))
+        self._raw = {name: data[name] for name in self._nested if data.get(name) is not None} or None
+
+    def __getattr__(self, name):
+        parser = type(self)._nested.get(name)
+        if parser is None:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        raw = self._raw.pop(name, None) if self._raw else None
+        value = parser(raw) if raw is not None else None
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields[:2])
+        return f'{type(self).__name__}({fields})'
+
+
+def _list_of(model):
+    return lambda items: [model(item) if item is not None else None for item in items]
+
+
+def _raw(value):
+    return value
+
+
+class Artist(Model):
+    _fields = ('id', 'name', 'uri', 'popularity', 'genres')
+    _nested = {'images': _raw}
+    __slots__ = _fields + tuple(_nested)
+
+
+class Album(Model):
+    _fields = ('id', 'name', 'uri', 'album_type', 'release_date', 'release_date_precision', 'total_tracks',
+               'label', 'popularity', 'genres')
+    _nested = {'artists': _list_of(Artist), 'images': _raw, 'tracks': lambda data: Paging(data)}
+    __slots__ = _fields + tuple(_nested)
+
+
+class Track(Model):
+    _fields = ('id', 'name', 'uri', 'duration_ms', 'explicit', 'popularity', 'track_number', 'disc_number',
+               'is_local', 'preview_url')
+    _nested = {'album': Album, 'artists': _list_of(Artist), 'external_ids': _raw}
+    __slots__ = _fields + tuple(_nested)
+
+
+class AudioFeatures(Model):
+    _fields = ('id', 'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+               'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature')
+    __slots__ = _fields
+
+
+class PlaylistItem(Model):
+    _fields = ('added_at', 'is_local')
+    _nested = {'track': lambda data: parse(data), 'added_by': _raw}
+    __slots__ = _fields + tuple(_nested)
+
+
+class Paging(Model):
+    # cursors stays the raw {'after': ..., 'before': ...} dict of cursor-paged endpoints.
+    _fields = ('href', 'limit', 'offset', 'total', 'next', 'previous', 'cursors')
+    _nested = {'items': lambda items: [parse(item) for item in items]}
+    __slots__ = _fields + tuple(_nested)
+
+
+MODELS = {
+    'track': Track,
+    'album': Album,
+    'artist': Artist,
+    'audio_features': AudioFeatures,
+}
+
+
+def parse(data):
+    '''Convert a decoded response into models where its objects are recognized
+
+    Anything without a model (users, playlists, envelopes) stays a dict or
+    list, with the recognized objects inside it converted.
+    '''
+    if isinstance(data, list):
+        return [parse(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    model = MODELS.get(data.get('type'))
+    if model is not None:
+        return model(data)
+    if 'items' in data and 'total' in data:
+        return Paging(data)
+    if 'added_at' in data and 'track' in data:
+        return PlaylistItem(data)
+    return {key: parse(value) for key, value in data.items()}
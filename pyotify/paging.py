@@ -0,0 +1,64 @@
+PAGE_LIMITS = {
+    'playlist_tracks': 100,
+}
+DEFAULT_PAGE_LIMIT = 50
+
+# Endpoints that wrap their paging object in a single-key envelope.
+ENVELOPES = {
+    'user_followed_artists': 'artists',
+    'category_playlists': 'playlists',
+    'featured_playlists': 'playlists',
+    'new_releases': 'albums',
+}
+
+# Cursor-paged endpoints and the cursor they follow.
+CURSORS = {
+    'user_followed_artists': 'after',
+    'recently_played': 'before',
+}
+
+SEARCH_MAX_OFFSET = 1000
+
+
+def page_limit(name):
+    return PAGE_LIMITS.get(name, DEFAULT_PAGE_LIMIT)
+
+
+def envelope_key(name, args, kwargs):
+    if name == 'search':
+        search_type = kwargs.get('type', args[1] if len(args) > 1 else None)
+        if not search_type or ',' in search_type:
+            raise ValueError('search can only be paginated over a single type')
+        return f'{search_type}s'
+    return ENVELOPES.get(name)
+
+
+def unwrap(response, key):
+    return response[key] if key else response
+
+
+def field(page, name):
+    # Pages are dicts, or models.Paging objects on clients created with models=True.
+    return page[name] if isinstance(page, dict) else getattr(page, name)
+
+
+def items(page):
+    return field(page, 'items')
+
+
+def remaining_offsets(name, page):
+    total = field(page, 'total')
+    if name == 'search':
+        total = min(total, SEARCH_MAX_OFFSET)
+    limit = field(page, 'limit') or DEFAULT_PAGE_LIMIT
+    return range(field(page, 'offset') + limit, total, limit)
+
+
+def next_cursor(name, page):
+    if isinstance(page, dict):
+        next, cursors = page.get('next'), page.get('cursors')
+    else:
+        next, cursors = page.next, page.cursors
+    if not next or not cursors:
+        return None
+    return cursors.get(CURSORS[name])
@@ -0,0 +1,258 @@
+'''Event driven playback watching for many users on one event loop
+
+    watcher = PlaybackWatcher()
+    watcher.on('track_changed', lambda event: print(event.key, event.track_id))
+    watcher.watch('alice', AsyncSpotify(client_id, client_secret, redirect_uri, cached_token_path=alice_token))
+    await watcher.run()
+
+or consume the events with async for:
+
+    async with watcher:
+        async for event in watcher.events():
+            ...
+'''
+import heapq
+import asyncio
+import inspect
+import logging
+import itertools
+
+import pyotify.utils as utils
+from .paging import field
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ('track_changed', 'paused', 'resumed', 'device_changed', 'seek', 'stopped')
+
+
+class PlaybackEvent:
+    __slots__ = ('type', 'key', 'state', 'previous')
+
+    def __init__(self, type, key, state, previous):
+        self.type = type
+        self.key = key
+        self.state = state
+        self.previous = previous
+
+    @property
+    def track_id(self):
+        return _track_id(self.state)
+
+    def __repr__(self):
+        return f'PlaybackEvent({self.type!r}, {self.key!r}, track_id={self.track_id!r})'
+
+
+def _track_id(state):
+    item = field(state, 'item') if state else None
+    return field(item, 'id') if item else None
+
+
+def _device_id(state):
+    device = field(state, 'device') if state else None
+    return field(device, 'id') if device else None
+
+
+class _User:
+    __slots__ = ('client', 'state', 'fetched_at', 'idle_delay', 'due', 'polls')
+
+    def __init__(self, client):
+        self.client = client
+        self.state = None
+        self.fetched_at = None
+        self.idle_delay = 0
+        self.due = 0
+        self.polls = 0
+
+
+class PlaybackWatcher:
+    '''Polls current_playback of many AsyncSpotify clients and emits change events
+
+    While a track plays, the next poll is due end_margin seconds before the
+    track should end, but at least every max_interval seconds to notice
+    skips, seeks and device changes. Once less than min_interval is left,
+    polls come every min_interval seconds until the next track shows up. When nothing plays (paused, or a 204
+    from the API) the interval starts at idle_interval and doubles up to
+    idle_max_interval. A jump of more than seek_tolerance seconds against
+    the expected progress is reported as a seek. At most concurrency polls
+    run at once.
+    '''
+
+    def __init__(self, callback=None, min_interval=1, max_interval=30, idle_interval=5, idle_max_interval=120,
+                 end_margin=0.5, seek_tolerance=3, concurrency=50, market=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.idle_max_interval = idle_max_interval
+        self.end_margin = end_margin
+        self.seek_tolerance = seek_tolerance
+        self.concurrency = concurrency
+        self.market = market
+        self._callbacks = {}
+        self._queues = []
+        self._users = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._running = False
+        if callback is not None:
+            self.on(None, callback)
+
+    def on(self, type, callback):
+        '''Call callback(event) for events of type, or for every event if type is None
+
+        callback may be a coroutine function.
+        '''
+        if type is not None and type not in EVENTS:
+            raise ValueError(f'unknown playback event {type!r}, expected one of {EVENTS}')
+        self._callbacks.setdefault(type, []).append(callback)
+        return callback
+
+    async def events(self, maxsize=0):
+        '''Yield every event emitted from now on'''
+        queue = asyncio.Queue(maxsize)
+        self._queues.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues.remove(queue)
+
+    def watch(self, key, client):
+        user = _User(client)
+        self._users[key] = user
+        self._schedule(key, user, 0)
+
+    def unwatch(self, key):
+        self._users.pop(key, None)
+
+    def state(self, key):
+        return self._users[key].state
+
+    def stats(self):
+        return {key: user.polls for key, user in self._users.items()}
+
+    def _loop_time(self):
+        return asyncio.get_running_loop().time() if self._running else 0
+
+    def _schedule(self, key, user, delay):
+        user.due = self._loop_time() + delay
+        heapq.heappush(self._heap, (user.due, next(self._counter), key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def next_delay(self, user):
+        '''Seconds until the next poll of user, given its last known state'''
+        state = user.state
+        item = field(state, 'item') if state else None
+        if not item or not field(state, 'is_playing'):
+            user.idle_delay = min(self.idle_max_interval, user.idle_delay * 2) if user.idle_delay else self.idle_interval
+            return user.idle_delay
+        user.idle_delay = 0
+        remaining = (field(item, 'duration_ms') - (field(state, 'progress_ms') or 0)) / 1000
+        return min(self.max_interval, max(self.min_interval, remaining - self.end_margin))
+
+    def detect(self, previous, state, elapsed):
+        '''Event types between two states polled elapsed seconds apart, elapsed is None on the first poll'''
+        if elapsed is None:
+            return ['track_changed'] if _track_id(state) else []
+        if state is None:
+            return ['stopped'] if previous is not None else []
+        events = []
+        if previous is not None and _device_id(previous) != _device_id(state):
+            events.append('device_changed')
+        track_changed = _track_id(previous) != _track_id(state)
+        if track_changed:
+            events.append('track_changed')
+        is_playing = bool(field(state, 'is_playing'))
+        if previous is not None and bool(field(previous, 'is_playing')) != is_playing:
+            events.append('resumed' if is_playing else 'paused')
+        elif not track_changed:
+            # Across a pause or resume nobody knows how long it played, so seeks are only spotted in between.
+            expected = (field(previous, 'progress_ms') or 0) + (elapsed * 1000 if is_playing else 0)
+            if abs((field(state, 'progress_ms') or 0) - expected) > self.seek_tolerance * 1000:
+                events.append('seek')
+        return events
+
+    async def _emit(self, event):
+        for callback in self._callbacks.get(event.type, []) + self._callbacks.get(None, []):
+            try:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception('playback event callback failed')
+        for queue in self._queues:
+            await queue.put(event)
+
+    async def _poll(self, key, user, semaphore):
+        async with semaphore:
+            try:
+                state = await user.client.current_playback(market=self.market)
+            except Exception:
+                logger.warning('polling playback of %r failed', key, exc_info=True)
+                if self._users.get(key) is user:
+                    self._schedule(key, user, self.max_interval)
+                return
+        user.polls += 1
+        if self._users.get(key) is not user:
+            return
+
+        # current_playback answers 204 No Content when nothing is playing.
+        if state == utils.empty_response(None):
+            state = None
+        now = asyncio.get_running_loop().time()
+        previous = user.state
+        types = self.detect(previous, state, now - user.fetched_at if user.fetched_at is not None else None)
+        user.state, user.fetched_at = state, now
+        self._schedule(key, user, self.next_delay(user))
+        for type in types:
+            await self._emit(PlaybackEvent(type, key, state, previous))
+
+    async def run(self):
+        '''Poll until stop() is called'''
+        loop = asyncio.get_running_loop()
+        self._running = True
+        self._wakeup = asyncio.Event()
+        # Polls scheduled before the loop ran are due right away.
+        self._heap = [(0, count, key) for _, count, key in self._heap]
+        for user in self._users.values():
+            user.due = 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        polls = set()
+        try:
+            while self._running:
+                now = loop.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, key = heapq.heappop(self._heap)
+                    user = self._users.get(key)
+                    if user is None or user.due != due:
+                        continue
+                    task = asyncio.ensure_future(self._poll(key, user, semaphore))
+                    polls.add(task)
+                    task.add_done_callback(polls.discard)
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._running = False
+            for task in polls:
+                task.cancel()
+
+    def stop(self):
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def __aenter__(self):
+        self._task = asyncio.ensure_future(self.run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.stop()
+        if self._task is not None:
+            await self._task
+            self._task = None
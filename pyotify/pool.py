@@ -0,0 +1,118 @@
+import time
+import threading
+
+import pyotify.auth as auth
+from .client import Spotify
+from .aio import AsyncSpotify
+from .transport import error_status
+
+
+class Lane:
+    '''One set of app credentials with its own token and rate-limit state'''
+
+    def __init__(self, client_id, token_manager, scheduler):
+        self.client_id = client_id
+        self.token_manager = token_manager
+        self.scheduler = scheduler
+        self.in_flight = 0
+        self.requests = 0
+
+    def load(self, now):
+        '''Sort key of the lane, lower is better
+
+        Paused lanes come last, ordered by when they resume. The others are
+        ordered by requests in flight, then by how often they were throttled.
+        '''
+        if self.scheduler.paused_until > now:
+            return (1, self.scheduler.paused_until, 0)
+        return (0, self.in_flight, self.scheduler.throttled)
+
+
+def _first(credentials, client_kwargs):
+    if 'token_manager' in client_kwargs:
+        raise TypeError('a pool creates the token manager of every credential itself')
+    if not credentials:
+        raise ValueError('at least one set of credentials is required')
+    return credentials[0]
+
+
+class _LanePool:
+    def _create_lanes(self, credentials):
+        # Each lane gets its own copy of the scheduler, rate-limit state is per credential.
+        template = self.scheduler
+        lanes = []
+        for client_id, client_secret in credentials:
+            credentials_auth = auth.SpotifyClientCredentialsAuth(None, client_id, client_secret,
+                                                                 token_url=self._token_url)
+            scheduler = template.copy(retry_throttled=False)
+            lanes.append(Lane(client_id, auth.TokenManager(credentials_auth), scheduler))
+        self.lanes = lanes
+        self.token_manager = lanes[0].token_manager
+        self._token_managers = [lane.token_manager for lane in lanes]
+        self.scheduler = lanes[0].scheduler
+        self._lanes_lock = threading.Lock()
+
+    def _acquire_lane(self):
+        with self._lanes_lock:
+            now = time.monotonic()
+            lane = min(self.lanes, key=lambda lane: lane.load(now))
+            lane.in_flight += 1
+            lane.requests += 1
+            return lane
+
+    def _release_lane(self, lane):
+        with self._lanes_lock:
+            lane.in_flight -= 1
+
+    def stats(self):
+        return {lane.client_id: {'in_flight': lane.in_flight, 'requests': lane.requests,
+                                 'throttled': lane.scheduler.throttled} for lane in self.lanes}
+
+
+class SpotifyPool(_LanePool, Spotify):
+    '''Spotify client spreading requests over several app credentials
+
+    credentials is an iterable of (client_id, client_secret) pairs. Each
+    pair gets its own token and RequestScheduler. Every request goes to the
+    least loaded credential that is not paused by a 429, and a request
+    that gets a 429 is retried on another credential.
+
+    Other keyword arguments, e.g. models or scheduler, are those of Spotify.
+    A scheduler passed in is copied for every credential.
+    '''
+
+    def __init__(self, credentials, **client_kwargs):
+        credentials = list(credentials)
+        super().__init__(*_first(credentials, client_kwargs), **client_kwargs)
+        self._create_lanes(credentials)
+
+    def _dispatch(self, method, url, request, params, kwargs):
+        for attempt in range(self.max_retries + 1):
+            lane = self._acquire_lane()
+            try:
+                return self._call(lane.token_manager, lane.scheduler, method, url, request, params, kwargs)
+            except Exception as e:
+                if error_status(e) != 429 or attempt == self.max_retries:
+                    raise
+            finally:
+                self._release_lane(lane)
+
+
+class AsyncSpotifyPool(_LanePool, AsyncSpotify):
+    '''AsyncSpotify counterpart of SpotifyPool sharing one connection pool across all credentials'''
+
+    def __init__(self, credentials, **client_kwargs):
+        credentials = list(credentials)
+        super().__init__(*_first(credentials, client_kwargs), **client_kwargs)
+        self._create_lanes(credentials)
+
+    async def _dispatch(self, method, url, request, params, kwargs):
+        for attempt in range(self.max_retries + 1):
+            lane = self._acquire_lane()
+            try:
+                return await self._call(lane.token_manager, lane.scheduler, method, url, request, params, kwargs)
+            except Exception as e:
+                if error_status(e) != 429 or attempt == self.max_retries:
+                    raise
+            finally:
+                self._release_lane(lane)
@@ -0,0 +1,190 @@
+'''Recommendations for many seed sets at once
+
+    engine = RecommendationEngine(sp)
+    mixes = engine.recommend([
+        SeedSet(artists=[artist_id], tracks=user_top_tracks, energy=(0.5, 0.9)),
+        SeedSet(genres=['house', 'techno'], tempo=124),
+    ], limit=50)
+
+A seed set may have any number of seeds. Each one is split into windows of
+at most five seeds, one recommendations request per window, and the tracks
+of its windows are merged, deduplicated and ranked. Identical windows of
+different seed sets share one request, and all requests run concurrently
+through the client.
+'''
+import time
+import logging
+
+import pyotify.utils as utils
+from .paging import field
+
+logger = logging.getLogger(__name__)
+
+MAX_SEEDS = 5
+MAX_LIMIT = 100
+KINDS = ('artists', 'genres', 'tracks')
+ATTRIBUTES = ('acousticness', 'danceability', 'duration_ms', 'energy', 'instrumentalness', 'key', 'liveness',
+              'loudness', 'mode', 'popularity', 'speechiness', 'tempo', 'time_signature', 'valence')
+
+
+def tunable_params(**values):
+    '''target_*, min_* and max_* parameters of recommendations
+
+    energy=0.8 becomes target_energy, energy=(0.5, 0.9) becomes min_energy
+    and max_energy, and either end of the range may be None. Names that
+    already carry a target_, min_ or max_ prefix are passed through.
+    '''
+    params = {}
+    for name, value in values.items():
+        prefix, _, attribute = name.partition('_')
+        if prefix in ('target', 'min', 'max') and attribute in ATTRIBUTES:
+            params[name] = value
+        elif name not in ATTRIBUTES:
+            raise ValueError(f'unknown tunable attribute {name!r}, expected one of {ATTRIBUTES}')
+        elif isinstance(value, (tuple, list)):
+            low, high = value
+            params.update({f'min_{name}': low, f'max_{name}': high})
+        else:
+            params[f'target_{name}'] = value
+    return {name: value for name, value in params.items() if value is not None}
+
+
+def _tracks(response):
+    '''Tracks of a recommendations response, none for a missing response'''
+    return (field(response, 'tracks') if response is not None else None) or []
+
+
+class SeedSet:
+    '''Seeds and tunable attributes of one mix, see tunable_params() for the keyword arguments'''
+    __slots__ = ('artists', 'genres', 'tracks', 'params')
+
+    def __init__(self, artists=(), genres=(), tracks=(), **tunables):
+        self.artists = utils.dedupe(artists)
+        self.genres = utils.dedupe(genres)
+        self.tracks = utils.dedupe(tracks)
+        self.params = tunable_params(**tunables)
+
+    def windows(self, genres=None):
+        '''The seeds as lists of at most MAX_SEEDS (kind, id) pairs
+
+        Kinds are interleaved so that each window mixes artists, genres and
+        tracks in about the proportions of the whole set. Genre seeds that
+        are not in genres are left out, unless genres is None.
+        '''
+        seeds = []
+        lists = [[(kind, id) for id in getattr(self, kind) if kind != 'genres' or genres is None or id in genres]
+                 for kind in KINDS]
+        for i in range(max(map(len, lists))):
+            seeds.extend(seeds_of_kind[i] for seeds_of_kind in lists if i < len(seeds_of_kind))
+        return list(utils.chunked(seeds, MAX_SEEDS))
+
+    def __repr__(self):
+        return f'SeedSet(artists={self.artists!r}, genres={self.genres!r}, tracks={self.tracks!r}, **{self.params!r})'
+
+
+class Recommendation:
+    '''A recommended track with how many windows returned it and its rank score'''
+    __slots__ = ('track', 'count', 'score')
+
+    def __init__(self, track, count, score):
+        self.track = track
+        self.count = count
+        self.score = score
+
+    @property
+    def id(self):
+        return field(self.track, 'id')
+
+    def __repr__(self):
+        return f'Recommendation({self.id!r}, count={self.count}, score={self.score:.3f})'
+
+
+class RecommendationEngine:
+    '''Generates, runs and merges the recommendations requests of many seed sets
+
+    Works with Spotify and AsyncSpotify clients; with AsyncSpotify, recommend()
+    and genres() return awaitables. Every request asks for per_call tracks,
+    by default twice the requested limit. Tracks are ranked by the number of
+    windows of their seed set that returned them, then by the sum of their
+    positions in those windows (1 for the first track down to 1/n for the
+    last). Genre seeds missing from available_genre_seeds() are dropped with
+    a warning. The genre list is fetched once per genre_ttl seconds.
+    '''
+
+    def __init__(self, client, per_call=None, exclude_seeds=True, genre_ttl=86400):
+        self.client = client
+        self.per_call = per_call
+        self.exclude_seeds = exclude_seeds
+        self.genre_ttl = genre_ttl
+        self.requests = 0
+        self._genres = None
+        self._genres_expire = 0
+
+    def genres(self):
+        '''The available genre seeds as a set, cached for genre_ttl seconds'''
+        if self._genres is not None and time.monotonic() < self._genres_expire:
+            return self.client._completed(self._genres)
+
+        def store(response):
+            self._genres = frozenset(field(response, 'genres'))
+            self._genres_expire = time.monotonic() + self.genre_ttl
+            return self._genres
+
+        return self.client._then(self.client.available_genre_seeds(), store)
+
+    def recommend(self, seed_sets, limit=20, market=None):
+        '''Ranked [Recommendation] of at most limit tracks for each of seed_sets
+
+        seed_sets are SeedSet objects or dicts of SeedSet keyword arguments.
+        '''
+        seed_sets = [seeds if isinstance(seeds, SeedSet) else SeedSet(**seeds) for seeds in seed_sets]
+        if any(seeds.genres for seeds in seed_sets):
+            return self.client._then(self.genres(),
+                                     lambda genres: self._recommend(seed_sets, limit, market, genres))
+        return self._recommend(seed_sets, limit, market, None)
+
+    def _recommend(self, seed_sets, limit, market, genres):
+        per_call = min(MAX_LIMIT, self.per_call or 2 * limit)
+        requests = {}
+        plans = []
+        for seeds in seed_sets:
+            unknown = [genre for genre in seeds.genres if genres is not None and genre not in genres]
+            if unknown:
+                logger.warning('dropping unknown genre seeds %s', unknown)
+            keys = []
+            for window in seeds.windows(genres):
+                key = (tuple(sorted(window)), tuple(sorted(seeds.params.items())))
+                requests.setdefault(key, (window, seeds.params))
+                keys.append(key)
+            plans.append((seeds, keys))
+
+        keys = list(requests)
+        self.requests += len(keys)
+
+        def fetch(window, params):
+            ids = {kind: ','.join(id for seed_kind, id in window if seed_kind == kind) or None for kind in KINDS}
+            return self.client.recommendations(limit=per_call, market=market, seed_artists=ids['artists'],
+                                               seed_genres=ids['genres'], seed_tracks=ids['tracks'], **params)
+
+        def merge(responses):
+            tracks_of = dict(zip(keys, map(_tracks, responses)))
+            return [self._rank(seeds, [tracks_of[key] for key in window_keys], limit)
+                    for seeds, window_keys in plans]
+
+        return self.client._then(self.client._fan_out(fetch, [requests[key] for key in keys]), merge)
+
+    def _rank(self, seeds, track_lists, limit):
+        excluded = set(seeds.tracks) if self.exclude_seeds else set()
+        found = {}
+        for tracks in track_lists:
+            for position, track in enumerate(tracks):
+                id = field(track, 'id') if track is not None else None
+                if id is None or id in excluded:
+                    continue
+                recommendation = found.get(id)
+                if recommendation is None:
+                    recommendation = found[id] = Recommendation(track, 0, 0.0)
+                recommendation.count += 1
+                recommendation.score += 1 - position / len(tracks)
+        ranked = sorted(found.values(), key=lambda recommendation: (-recommendation.count, -recommendation.score))
+        return ranked[:limit]
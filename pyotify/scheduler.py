@@ -0,0 +1,105 @@
+import time
+import random
+import threading
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class TokenBucket:
+    '''Thread-safe token bucket allowing rate requests per second with bursts of capacity'''
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        '''Take one token and return how many seconds the caller must wait before using it'''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class RequestScheduler:
+    '''Decides when a request may be sent and whether a failed one is retried
+
+    A 429 pauses every request going through the scheduler until its
+    Retry-After has passed, so concurrent callers back off together instead
+    of each hitting the limit again. 5xx responses and connection errors are
+    retried with jittered exponential backoff, but only for idempotent
+    requests: a POST that may have reached the API is not sent twice. With
+    retry_throttled=False a 429 still pauses the scheduler but is returned
+    to the caller, which may send the request elsewhere.
+    '''
+
+    def __init__(self, rate=None, burst=None, max_retries=10, timeout=None, backoff_base=0.5, backoff_max=30,
+                 retry_throttled=True):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retry_throttled = retry_throttled
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.paused_until = 0
+        self.throttled = 0
+
+    def copy(self, **changes):
+        '''A scheduler with the same settings, and changes, but none of the rate-limit state'''
+        settings = {'rate': self.bucket.rate if self.bucket else None,
+                    'burst': self.bucket.capacity if self.bucket else None, 'max_retries': self.max_retries,
+                    'timeout': self.timeout, 'backoff_base': self.backoff_base, 'backoff_max': self.backoff_max,
+                    'retry_throttled': self.retry_throttled}
+        settings.update(changes)
+        return type(self)(**settings)
+
+    def delay(self):
+        delay = max(0, self.paused_until - time.monotonic())
+        if self.bucket is not None:
+            delay = max(delay, self.bucket.reserve())
+        return delay
+
+    def wait(self):
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        import asyncio
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def retry_after(self, attempt, status=None, headers=None, idempotent=True):
+        '''Return the seconds to wait before retrying, or None if the request should not be retried
+
+        status is None for a connection error. idempotent is False for a
+        request that must not be repeated once the API may have acted on it,
+        which a 429 guarantees it did not.
+        '''
+        if attempt >= self.max_retries:
+            return None
+        if status == 429:
+            self.throttled += 1
+            try:
+                delay = float(headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                delay = self.backoff(attempt)
+            self.pause(delay)
+            return delay if self.retry_throttled else None
+        if idempotent and (status is None or status in RETRY_STATUSES):
+            return self.backoff(attempt)
+        return None
@@ -0,0 +1,118 @@
+'''Persistent store of catalog objects
+
+EntityStore keeps tracks, albums, artists and audio features in a SQLite
+database keyed on their Spotify ID, so they only have to be fetched once:
+
+    store = EntityStore('catalog.db')
+    sp = Spotify(client_id, client_secret, store=store)
+    sp.bulk_tracks(track_ids)    # only requests the IDs not in the store
+
+The database runs in WAL mode and every process opens its own connection,
+so worker processes on one host can share one file.
+'''
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from . import utils
+
+DAY = 24 * 60 * 60
+
+
+class EntityStore:
+    '''SQLite backed store of API objects per entity type and ID
+
+    Objects expire after the TTL of their type in ttls, or default_ttl for
+    types not listed there. timeout is how long a write waits for another
+    process holding the database lock.
+    '''
+    ttls = {'track': 30 * DAY, 'album': 30 * DAY, 'artist': DAY, 'audio_features': 90 * DAY}
+    batch_size = 500
+
+    def __init__(self, path, ttls=None, default_ttl=7 * DAY, timeout=30):
+        self.path = path
+        self.ttls = {**self.ttls, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connection()
+
+    def _connection(self):
+        # sqlite3 connections must not cross a fork or be shared between threads.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entities (type TEXT NOT NULL, id TEXT NOT NULL, '
+                               'data TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (type, id)) WITHOUT ROWID')
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def ttl(self, type):
+        return self.ttls.get(type, self.default_ttl)
+
+    def get(self, type, id):
+        return self.get_many(type, [id]).get(id)
+
+    def get_many(self, type, ids):
+        '''Return {id: object} for the IDs stored and not expired'''
+        ids = utils.dedupe(ids)
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        for chunk in utils.chunked(ids, self.batch_size):
+            rows = connection.execute(
+                f'SELECT id, data FROM entities WHERE type = ? AND expires_at > ? '
+                f'AND id IN ({",".join("?" * len(chunk))})', (type, now, *chunk))
+            found.update((id, utils.json_loads(data)) for id, data in rows)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        return found
+
+    def put(self, type, id, obj):
+        self.put_many(type, {id: obj})
+
+    def put_many(self, type, objects):
+        '''Store {id: object} in one transaction'''
+        if not objects:
+            return
+        expires_at = time.time() + self.ttl(type)
+        rows = [(type, id, json.dumps(obj, separators=(',', ':')), expires_at) for id, obj in objects.items()]
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO entities (type, id, data, expires_at) VALUES (?, ?, ?, ?)',
+                                   rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def delete(self, type, ids):
+        connection = self._connection()
+        for chunk in utils.chunked(utils.dedupe(ids), self.batch_size):
+            connection.execute(f'DELETE FROM entities WHERE type = ? AND id IN ({",".join("?" * len(chunk))})',
+                               (type, *chunk))
+
+    def purge(self):
+        '''Delete expired objects and return how many were removed'''
+        return self._connection().execute('DELETE FROM entities WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local = threading.local()
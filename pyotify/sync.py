@@ -0,0 +1,167 @@
+'''Incremental playlist and library sync
+
+A Sync keeps one snapshot per playlist or library in a SnapshotStore and
+only reports what changed since the previous sync.
+'''
+import os
+import json
+import hashlib
+import itertools
+from collections import Counter
+
+from . import utils
+from .paging import field
+
+
+class SnapshotStore:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, snapshot):
+        raise NotImplementedError
+
+
+class MemorySnapshotStore(SnapshotStore):
+    def __init__(self):
+        self._snapshots = {}
+
+    def get(self, key):
+        return self._snapshots.get(key)
+
+    def set(self, key, snapshot):
+        self._snapshots[key] = snapshot
+
+
+class FileSnapshotStore(SnapshotStore):
+    '''Stores each snapshot as a JSON file in directory'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, snapshot):
+        path = self._path(key)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
+
+
+class Diff:
+    __slots__ = ('key', 'snapshot_id', 'added', 'removed', 'changed')
+
+    def __init__(self, key, snapshot_id=None, added=(), removed=(), changed=True):
+        self.key = key
+        self.snapshot_id = snapshot_id
+        self.added = list(added)
+        self.removed = list(removed)
+        self.changed = changed
+
+    def __repr__(self):
+        return f'Diff({self.key!r}, added={len(self.added)}, removed={len(self.removed)}, changed={self.changed})'
+
+
+def _uri(item, kind):
+    obj = field(item, kind)
+    return field(obj, 'uri') if obj is not None else None
+
+
+class Sync:
+    '''Mirrors playlists and saved libraries through a Spotify client
+
+    sync_playlist() costs one snapshot_id request when the playlist did not
+    change. sync_saved_tracks() and sync_saved_albums() page from the newest
+    item and stop at the first one older than the newest item already seen;
+    the first page is fetched on its own, following pages with up to
+    prefetch pages requested ahead. The total reported by the API is compared
+    with the expected count to decide whether removals need to be looked up.
+    '''
+    playlist_fields = 'items(added_at,track(id,uri,name)),total,limit,offset,next'
+
+    def __init__(self, client, store=None, prefetch=2):
+        self.client = client
+        self.store = store if store is not None else MemorySnapshotStore()
+        self.prefetch = prefetch
+
+    def sync_playlist(self, playlist_id):
+        key = f'playlist:{playlist_id}'
+        snapshot_id = field(self.client.playlist(playlist_id, fields='snapshot_id'), 'snapshot_id')
+        previous = self.store.get(key)
+        if previous is not None and previous['snapshot_id'] == snapshot_id:
+            return Diff(playlist_id, snapshot_id, changed=False)
+
+        items = list(self.client.paginate(self.client.playlist_tracks, playlist_id, fields=self.playlist_fields,
+                                          prefetch=self.prefetch))
+        current = [[_uri(item, 'track'), field(item, 'added_at')] for item in items]
+
+        old = Counter(map(tuple, previous['items'])) if previous else Counter()
+        new = Counter(map(tuple, current))
+        added_keys = new - old
+        added = []
+        for item, item_key in zip(items, map(tuple, current)):
+            if added_keys[item_key]:
+                added_keys[item_key] -= 1
+                added.append(item)
+        removed = [{'uri': uri, 'added_at': added_at} for uri, added_at in (old - new).elements()]
+
+        self.store.set(key, {'snapshot_id': snapshot_id, 'items': current})
+        return Diff(playlist_id, snapshot_id, added, removed)
+
+    def sync_playlists(self, playlist_ids):
+        for playlist_id in playlist_ids:
+            yield self.sync_playlist(playlist_id)
+
+    def sync_saved_tracks(self, key='me'):
+        return self._sync_library(key, 'track', self.client.saved_tracks, self.client.bulk_saved_tracks_contains)
+
+    def sync_saved_albums(self, key='me'):
+        return self._sync_library(key, 'album', self.client.saved_albums, self.client.bulk_saved_albums_contains)
+
+    def _sync_library(self, key, kind, fetch_page, contains):
+        store_key = f'saved_{kind}s:{key}'
+        previous = self.store.get(store_key) or {'total': 0, 'latest_added_at': '', 'latest_ids': [], 'ids': []}
+        latest_added_at = previous['latest_added_at']
+        # Several items can share one added_at second, only those already seen at it are known.
+        latest_ids = set(previous.get('latest_ids', previous['ids']))
+
+        page = fetch_page(limit=50)
+        items = field(page, 'items')
+        if items and field(items[-1], 'added_at') >= latest_added_at and len(items) < field(page, 'total'):
+            items = itertools.chain(items, self.client.paginate(fetch_page, limit=50, offset=len(items),
+                                                                prefetch=self.prefetch))
+        added = []
+        for item in items:
+            added_at = field(item, 'added_at')
+            if added_at < latest_added_at:
+                break
+            if added_at > latest_added_at or field(field(item, kind), 'id') not in latest_ids:
+                added.append(item)
+
+        added_ids = [field(field(item, kind), 'id') for item in added]
+        ids = utils.dedupe(added_ids + previous['ids'])
+        removed = []
+        if field(page, 'total') != len(ids):
+            # Something was removed since the last sync, find out which of the known items are gone.
+            new_ids = set(added_ids)
+            known_ids = [id for id in previous['ids'] if id not in new_ids]
+            removed = [id for id, is_saved in zip(known_ids, contains(known_ids)) if not is_saved]
+            gone = set(removed)
+            ids = [id for id in ids if id not in gone]
+
+        if added:
+            newest = field(added[0], 'added_at')
+            latest_ids = latest_ids if newest == latest_added_at else set()
+            latest_added_at = newest
+            latest_ids.update(id for item, id in zip(added, added_ids) if field(item, 'added_at') == newest)
+        self.store.set(store_key, {'total': len(ids), 'latest_added_at': latest_added_at,
+                                   'latest_ids': sorted(latest_ids), 'ids': ids})
+        return Diff(key, added=added, removed=removed, changed=bool(added or removed))
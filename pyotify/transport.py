@@ -0,0 +1,263 @@
+'''HTTP transports the clients send their requests through
+
+    sp = Spotify(client_id, client_secret, transport=HTTPXTransport())   # HTTP/2
+    sp = AsyncSpotify(client_id, client_secret, transport=AsyncHTTPXTransport())
+
+Spotify uses RequestsTransport and AsyncSpotify uses AiohttpTransport
+unless another transport is passed. Every transport returns a Response
+with the whole body read and decompressed, lists the errors worth a retry
+in errors, and tells with sent(error) whether the request may have reached
+the server before the error.
+'''
+import time
+import importlib.util
+
+
+def accept_encoding(compression=True):
+    '''Accept-Encoding header for the codings the installed packages can decode'''
+    if not compression:
+        return 'identity'
+    if importlib.util.find_spec('brotli') or importlib.util.find_spec('brotlicffi'):
+        return 'gzip, br'
+    return 'gzip'
+
+
+def error_status(error):
+    '''HTTP status of an error raised by Response.raise_for_status(), None for other errors'''
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status
+    return getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def _import_httpx(name):
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError(f'{name} requires httpx, install it with: pip install pyotify[http2]') from None
+    return httpx
+
+
+class Response:
+    '''Status, headers and body of a response, the same for every transport
+
+    elapsed is the time from sending the request until the headers arrived.
+    raw is the response object of the underlying library.
+    '''
+    __slots__ = ('status_code', 'headers', 'content', 'elapsed', 'http_version', 'raw')
+
+    def __init__(self, status_code, headers, content, elapsed, http_version, raw):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+        self.http_version = http_version
+        self.raw = raw
+
+    def raise_for_status(self):
+        # Raises the HTTP error of the underlying library, e.g. requests.HTTPError for RequestsTransport.
+        if self.status_code >= 400:
+            self.raw.raise_for_status()
+
+    def __repr__(self):
+        return f'Response({self.status_code}, {self.http_version}, {len(self.content)} bytes)'
+
+
+class RequestsTransport:
+    '''HTTP/1.1 transport on a requests.Session, the default of Spotify
+
+    Up to max_connections connections are kept open, one per request in
+    flight. requests keeps idle connections until the server closes them,
+    keepalive_timeout=0 closes each connection after its request instead.
+    '''
+
+    def __init__(self, max_connections=10, keepalive_timeout=None, compression=True):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.exceptions import ConnectTimeoutError
+
+        self.errors = (requests.ConnectionError, requests.Timeout)
+        # urllib3 reports refused and unresolvable connections as subclasses of ConnectTimeoutError.
+        self._unsent_errors = (requests.ConnectTimeout, ConnectTimeoutError)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = accept_encoding(compression)
+        if keepalive_timeout == 0:
+            self.session.headers['Connection'] = 'close'
+
+    def request(self, method, url, headers=None, params=None, timeout=None, record=None, **kwargs):
+        response = self.session.request(method=method, url=url, headers=headers, params=params, timeout=timeout,
+                                        **kwargs)
+        version = getattr(response.raw, 'version', 11)
+        return Response(response.status_code, response.headers, response.content, response.elapsed.total_seconds(),
+                        f'HTTP/{version // 10}.{version % 10}', response)
+
+    def sent(self, error):
+        '''False if error happened while connecting, before any of the request was sent'''
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return not isinstance(error, self._unsent_errors) and not isinstance(reason, self._unsent_errors)
+
+    def close(self):
+        self.session.close()
+
+
+def _httpx_arguments(kwargs):
+    # httpx wants request bodies that are already encoded as content=.
+    data = kwargs.get('data')
+    if isinstance(data, (str, bytes)):
+        kwargs['content'] = kwargs.pop('data')
+    return kwargs
+
+
+def _connect_trace(record):
+    '''httpcore trace callback adding TCP and TLS setup time to record.connect'''
+    started = [0.0]
+
+    def trace(event, info):
+        if event in ('connection.connect_tcp.started', 'connection.start_tls.started'):
+            started[0] = time.perf_counter()
+        elif event in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+            record.connect += time.perf_counter() - started[0]
+
+    return trace
+
+
+def _async_connect_trace(record):
+    trace = _connect_trace(record)
+
+    async def async_trace(event, info):
+        trace(event, info)
+
+    return async_trace
+
+
+class HTTPXTransport:
+    '''HTTP/2 transport on an httpx.Client
+
+    The requests of all threads are multiplexed as streams over one TLS
+    connection per host, so concurrent calls neither open a connection each
+    nor wait for each other's responses. With http2=False it is an
+    HTTP/1.1 pool of max_connections connections. Idle connections are
+    closed after keepalive_timeout seconds.
+    '''
+
+    def __init__(self, max_connections=10, keepalive_timeout=30, compression=True, http2=True):
+        httpx = _import_httpx(type(self).__name__)
+        self.errors = (httpx.TransportError,)
+        self._unsent_errors = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                              keepalive_expiry=keepalive_timeout)
+        self.client = httpx.Client(http2=http2, limits=limits,
+                                   headers={'Accept-Encoding': accept_encoding(compression)})
+
+    def request(self, method, url, headers=None, params=None, timeout=None, record=None, **kwargs):
+        extensions = {'trace': _connect_trace(record)} if record is not None else None
+        request = self.client.build_request(method, url, headers=headers, params=params, timeout=timeout,
+                                            extensions=extensions, **_httpx_arguments(kwargs))
+        start = time.perf_counter()
+        response = self.client.send(request, stream=True)
+        try:
+            elapsed = time.perf_counter() - start
+            content = response.read()
+        finally:
+            response.close()
+        return Response(response.status_code, response.headers, content, elapsed, response.http_version, response)
+
+    def sent(self, error):
+        return not isinstance(error, self._unsent_errors)
+
+    def close(self):
+        self.client.close()
+
+
+class AiohttpTransport:
+    '''asyncio HTTP/1.1 transport on an aiohttp.ClientSession, the default of AsyncSpotify
+
+    The session is created on the first request, inside the running loop.
+    trace_configs are passed on to the session, a request's record is
+    handed to them as trace_request_ctx.
+    '''
+
+    def __init__(self, max_connections=100, keepalive_timeout=30, compression=True, trace_configs=None):
+        import asyncio
+        import aiohttp
+
+        self.errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        self._unsent_errors = (aiohttp.ClientConnectorError,)
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.compression = compression
+        self.trace_configs = trace_configs
+        self.session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        # The connector binds to the running loop, so it can only be created lazily.
+        if self.session is None or self.session.closed:
+            if self.keepalive_timeout == 0:
+                connector = aiohttp.TCPConnector(limit=self.max_connections, force_close=True)
+            else:
+                connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=self.trace_configs,
+                                                 headers={'Accept-Encoding': accept_encoding(self.compression)})
+        return self.session
+
+    async def request(self, method, url, headers=None, params=None, timeout=None, record=None, **kwargs):
+        import aiohttp
+
+        session = self._get_session()
+        start = time.perf_counter()
+        async with session.request(method=method, url=url, headers=headers, params=params,
+                                   timeout=aiohttp.ClientTimeout(total=timeout), trace_request_ctx=record,
+                                   **kwargs) as response:
+            elapsed = time.perf_counter() - start
+            content = await response.read()
+        return Response(response.status, response.headers, content, elapsed,
+                        f'HTTP/{response.version.major}.{response.version.minor}', response)
+
+    def sent(self, error):
+        return not isinstance(error, self._unsent_errors)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncHTTPXTransport:
+    '''asyncio counterpart of HTTPXTransport on an httpx.AsyncClient
+
+    Hundreds of concurrent requests share one HTTP/2 connection, up to the
+    number of concurrent streams the server allows on it.
+    '''
+
+    def __init__(self, max_connections=100, keepalive_timeout=30, compression=True, http2=True):
+        httpx = _import_httpx(type(self).__name__)
+        self.errors = (httpx.TransportError,)
+        self._unsent_errors = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                              keepalive_expiry=keepalive_timeout)
+        self.client = httpx.AsyncClient(http2=http2, limits=limits,
+                                        headers={'Accept-Encoding': accept_encoding(compression)})
+
+    async def request(self, method, url, headers=None, params=None, timeout=None, record=None, **kwargs):
+        extensions = {'trace': _async_connect_trace(record)} if record is not None else None
+        request = self.client.build_request(method, url, headers=headers, params=params, timeout=timeout,
+                                            extensions=extensions, **_httpx_arguments(kwargs))
+        start = time.perf_counter()
+        response = await self.client.send(request, stream=True)
+        try:
+            elapsed = time.perf_counter() - start
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        return Response(response.status_code, response.headers, content, elapsed, response.http_version, response)
+
+    def sent(self, error):
+        return not isinstance(error, self._unsent_errors)
+
+    async def close(self):
+        await self.client.aclose()
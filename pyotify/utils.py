@@ -1,13 +1,28 @@
 import time
+import json
 import base64
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+    except ImportError:
+        json_loads = json.loads
+
 
 def normalize_scope(scope):
     return ' '.join(sorted(scope.split()))
 
 
+def now():
+    return int(time.time())
+
+
 def is_token_expired(token, offset=60):
-    return token['expires_at'] - int(time.time()) < offset
+    return token['expires_at'] - now() < offset
 
 
 def get_authorization_headers(client_id, client_secret):
@@ -24,4 +39,33 @@ def add_custom_values_to_token(token, scope=None):
 def encode_image(image):
     with open(image, "rb") as f:
         enc_str = base64.b64encode(f.read())
-    return enc_str
\ No newline at end of file
+    return enc_str
+
+
+def empty_response(request):
+    '''What API calls return for a response without a body, e.g. a 204 No Content'''
+    return f'REQUEST {request} OK!'
+
+
+def clean_params(params):
+    if not params:
+        return {}
+    cleaned = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif isinstance(value, (list, tuple)):
+            value = ','.join(str(v) for v in value)
+        cleaned[key] = value
+    return cleaned
+
+
+def dedupe(items):
+    return list(dict.fromkeys(items))
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -25,6 +25,19 @@ setuptools.setup(
         'tests': {
             'pytest',
         },
+        'async': {
+            'aiohttp',
+        },
+        'speedups': {
+            'orjson',
+            'brotli',
+        },
+        'http2': {
+            'httpx[http2]',
+        },
+        'numpy': {
+            'numpy',
+        },
     },
     classifiers=[
         'Environment :: Console',
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.mock_server import MockSpotifyServer
+
+
+@pytest.fixture(scope='session')
+def server():
+    '''The offline mock of the Web API that the benchmarks run against'''
+    with MockSpotifyServer(playlist_size=250, library_size=120) as server:
+        yield server
@@ -0,0 +1,63 @@
+import math
+
+import pytest
+
+from pyotify import Spotify
+from pyotify.models import parse
+
+np = pytest.importorskip('numpy')
+from pyotify.analysis import AudioAnalysis, FeatureMatrix  # noqa: E402
+
+
+def features(id, **values):
+    return dict({name: i + 0.5 for i, name in enumerate(FeatureMatrix.columns)}, id=id, type='audio_features',
+                **values)
+
+
+def test_audio_analysis_arrays(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    analysis = client.audio_analysis_arrays('t1')
+    segments = server.analysis_segments
+    assert analysis.segments.pitches.shape == analysis.segments.timbre.shape == (segments, 12)
+    assert analysis.segments.timbre.dtype == np.float32
+    assert len(analysis.beats) == segments // 2 and analysis.beats.start.dtype == np.float32
+    assert analysis.sections.key.dtype == np.int8 and analysis.sections.key.tolist() == [5] * (segments // 80)
+    assert analysis.segments.pitches.flags['C_CONTIGUOUS']
+    raw = client.audio_analysis('t1')
+    assert analysis.segments.timbre[3].tolist() == pytest.approx(raw['segments'][3]['timbre'], rel=1e-6)
+    assert analysis.track == raw['track']
+
+
+def test_audio_analysis_with_missing_parts():
+    analysis = AudioAnalysis({'track': {'tempo': 90.0, 'codestring': 'x'},
+                              'segments': [{'start': 0.5, 'pitches': [0.1] * 5, 'timbre': [], 'confidence': None}]})
+    assert analysis.track == {'tempo': 90.0}
+    assert len(analysis.bars) == 0 and analysis.bars.start.shape == (0,)
+    assert analysis.segments.pitches.shape == (1, 12)
+    assert analysis.segments.pitches[0].tolist() == pytest.approx([0.1] * 5 + [0.0] * 7)
+    assert analysis.segments.confidence.tolist() == [0.0]
+
+
+def test_feature_matrix_rows_and_missing_features():
+    matrix = FeatureMatrix.from_features(['a', 'b', 'a', 'c'], [features('a'), None, features('c', tempo=None)])
+    assert matrix.ids == ['a', 'b', 'c'] and len(matrix) == 3
+    assert matrix.values.shape == (3, len(FeatureMatrix.columns)) and matrix.values.dtype == np.float32
+    assert matrix.row('a').tolist() == [i + 0.5 for i in range(len(FeatureMatrix.columns))]
+    assert np.isnan(matrix.row('b')).all()
+    assert math.isnan(matrix.column('tempo')[2]) and matrix.column('energy')[2] == 1.5
+
+
+def test_feature_matrix_from_models():
+    models = parse([features('a'), None])
+    matrix = FeatureMatrix.from_features(['a', 'b'], models)
+    assert matrix.row('a').tolist() == FeatureMatrix.from_features(['a'], [features('a')]).row('a').tolist()
+    assert np.isnan(matrix.row('b')).all()
+
+
+def test_audio_features_matrix(server):
+    client = server.client_class(Spotify)('id', 'secret', models=True)
+    ids = [f'f{i}' for i in range(130)]
+    matrix = client.audio_features_matrix(ids)
+    assert matrix.values.shape == (130, len(FeatureMatrix.columns))
+    assert not np.isnan(matrix.values).any()
+    assert matrix.column('time_signature').tolist() == [4] * 130
@@ -0,0 +1,126 @@
+import gc
+import threading
+
+from pyotify import Spotify
+from pyotify.auth import TokenManager
+import pyotify.utils as utils
+
+
+class CountingAuth:
+    '''Hands out tokens that expire in two minutes'''
+
+    def __init__(self):
+        self.requests = 0
+
+    def request_token(self, token=None):
+        self.requests += 1
+        return {'access_token': f'token{self.requests}', 'expires_at': utils.now() + 120}
+
+
+class FakeTimer:
+    '''threading.Timer stand-in that only runs when the test fires it'''
+
+    def __init__(self, delay, function, args=()):
+        self.delay = delay
+        self.function = function
+        self.args = args
+        self.daemon = False
+        self.started = False
+        self.cancelled = False
+        timers.append(self)
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        assert self.started
+        if not self.cancelled:
+            self.function(*self.args)
+
+
+timers = []
+
+
+def manager(auth):
+    timers.clear()
+    return TokenManager(auth, refresh_margin=60, timer=FakeTimer)
+
+
+def test_schedules_the_refresh_before_expiry():
+    tokens = manager(CountingAuth())
+    tokens.get_token()
+    timer, = timers
+    assert timer.started and timer.daemon
+    # utils.now() may tick over a second between fetching and scheduling.
+    assert timer.delay in (59, 60)
+
+
+def test_refreshes_tokens_in_use():
+    auth = CountingAuth()
+    tokens = manager(auth)
+    assert tokens.get_access_token() == 'token1'
+    timers[-1].fire()
+    assert auth.requests == 2
+    assert tokens.get_access_token() == 'token2'
+    assert len(timers) == 2 and timers[0].cancelled
+
+
+def test_idle_manager_stops_refreshing():
+    auth = CountingAuth()
+    tokens = manager(auth)
+    tokens.get_token()
+    timers[-1].fire()
+    timers[-1].fire()
+    # One refresh for the token that was used, none after it since nobody asked again.
+    assert auth.requests == 2
+    assert tokens.get_access_token() == 'token2'
+
+
+def test_collected_manager_stops_refreshing():
+    auth = CountingAuth()
+    tokens = manager(auth)
+    tokens.get_token()
+    del tokens
+    gc.collect()
+    timers[-1].fire()
+    assert auth.requests == 1
+
+
+def test_expired_tokens_are_fetched_in_the_foreground():
+    auth = CountingAuth()
+    tokens = manager(auth)
+    tokens.get_token()
+    tokens.token['expires_at'] = utils.now()
+    assert tokens.get_access_token() == 'token2'
+    assert auth.requests == 2
+
+
+def test_close_stops_the_client_token_manager():
+    auth = CountingAuth()
+    sp = Spotify('id', 'secret')
+    sp.token_manager.auth = auth
+    sp.token_manager.timer = FakeTimer
+    timers.clear()
+    assert sp.token == 'token1'
+    sp.close()
+    assert sp.token_manager._timer is None and timers[-1].cancelled
+    timers[-1].fire()
+    assert auth.requests == 1
+
+
+def test_close_keeps_shared_token_managers():
+    tokens = manager(CountingAuth())
+    tokens.get_token()
+    Spotify('id', 'secret', token_manager=tokens).close()
+    assert tokens._timer is not None and not timers[-1].cancelled
+
+
+def test_uses_daemon_threads_by_default():
+    tokens = TokenManager(CountingAuth(), refresh_margin=60)
+    tokens.get_token()
+    assert isinstance(tokens._timer, threading.Timer) and tokens._timer.daemon
+    tokens.stop()
+    assert tokens._timer is None
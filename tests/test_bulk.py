@@ -0,0 +1,61 @@
+import asyncio
+
+from pyotify import AsyncSpotify, Spotify
+
+
+def counted(server, call):
+    '''Result of call() and how many requests it sent to server'''
+    requests = server.stats()['requests']
+    result = call()
+    return result, server.stats()['requests'] - requests
+
+
+def test_bulk_tracks_are_chunked_in_order(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    ids = [f'b{i}' for i in range(120)]
+    tracks, requests = counted(server, lambda: client.bulk_tracks(ids))
+    assert requests == 3
+    assert [track['id'] for track in tracks] == ids
+
+
+def test_bulk_albums_use_their_own_limit(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    ids = [f'a{i}' for i in range(45)]
+    albums, requests = counted(server, lambda: client.bulk_albums(ids))
+    assert requests == 3
+    assert [album['id'] for album in albums] == ids
+
+
+def test_duplicate_ids_are_fetched_once(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    ids = [f'd{i % 60}' for i in range(150)][::-1]
+    features, requests = counted(server, lambda: client.bulk_audio_features(ids))
+    assert requests == 1
+    assert [feature['id'] for feature in features] == ids
+    assert features[0] is features[60]
+
+
+def test_bulk_contains_merges_plain_lists(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    ids = [f'saved{i}' if i % 3 else f'other{i}' for i in range(70)] + ['saved1']
+    saved, requests = counted(server, lambda: client.bulk_saved_tracks_contains(ids))
+    assert requests == 2
+    assert saved == [id.startswith('saved') for id in ids]
+
+
+def test_empty_ids_send_no_request(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    assert counted(server, lambda: client.bulk_artists([])) == ([], 0)
+
+
+def test_bulk_lookup_async(server):
+    ids = [f'b{i % 70}' for i in range(140)]
+
+    async def fetch():
+        async with server.client_class(AsyncSpotify)('id', 'secret') as client:
+            return await client.bulk_tracks(ids), await client.bulk_saved_albums_contains(['saved1', 'x'] * 15)
+
+    (tracks, saved), requests = counted(server, lambda: asyncio.run(fetch()))
+    assert requests == 2 + 1
+    assert [track['id'] for track in tracks] == ids
+    assert saved == [True, False] * 15
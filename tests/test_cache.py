@@ -0,0 +1,93 @@
+import json
+import threading
+
+import pytest
+
+from pyotify import Spotify
+from pyotify.cache import CacheEntry, MemoryCache, FileCache
+
+
+@pytest.mark.parametrize('path, cacheable', [
+    ('albums', True),
+    ('playlists/pl1/tracks', True),
+    ('audio-analysis/t1', True),
+    ('me', False),
+    ('me/tracks', False),
+    ('me/tracks/contains', False),
+    ('me/playlists', False),
+    ('me/player/currently-playing', False),
+    ('users/u1', False),
+    ('users/u1/playlists', False),
+    ('member', True),
+])
+def test_cacheable(path, cacheable):
+    assert MemoryCache().cacheable(path) == cacheable
+
+
+@pytest.fixture(params=['memory', 'file'])
+def cache(request, tmp_path):
+    return MemoryCache() if request.param == 'memory' else FileCache(str(tmp_path))
+
+
+def test_catalog_responses_are_cached(server, cache):
+    with server.client_class(Spotify)('id', 'secret', cache=cache) as sp:
+        first = sp.playlist_tracks('pl1')
+        not_modified = server.stats()['not_modified']
+        # The mock server sends max-age=0, so the entry is revalidated.
+        assert sp.playlist_tracks('pl1') == first
+        assert server.stats()['not_modified'] == not_modified + 1
+    assert cache.stats()['revalidations'] == 1
+
+
+def test_user_responses_are_not_shared(server, cache):
+    clients = [server.client_class(Spotify)('id', 'secret', cache=cache) for _ in range(2)]
+    not_modified = server.stats()['not_modified']
+    for sp in clients:
+        sp.saved_tracks()
+        sp.saved_tracks_contains(['t1'])
+        sp.me()
+        sp.close()
+    assert server.stats()['not_modified'] == not_modified
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'revalidations': 0}
+
+
+def test_memory_cache_hands_out_copies(server):
+    cache = MemoryCache()
+    with server.client_class(Spotify)('id', 'secret', cache=cache) as sp:
+        first = sp.playlist_tracks('pl2')
+        first['items'].clear()
+        first['total'] = -1
+        second = sp.playlist_tracks('pl2')
+        assert second['total'] == 250 and len(second['items']) == 100
+        second['items'][0]['track']['name'] = 'changed'
+        assert sp.playlist_tracks('pl2')['items'][0]['track']['name'] != 'changed'
+
+
+@pytest.mark.parametrize('content', ['{"value": [1, 2', '{"etag": null}', '[1, 2]', '\xff'])
+def test_corrupt_file_entries_are_misses(server, tmp_path, content):
+    cache = FileCache(str(tmp_path))
+    with server.client_class(Spotify)('id', 'secret', cache=cache) as sp:
+        first = sp.playlist_tracks('pl3')
+        path, = tmp_path.glob('*.json')
+        path.write_text(content, encoding='latin-1')
+        requests = server.stats()['requests']
+        assert sp.playlist_tracks('pl3') == first
+        assert server.stats()['requests'] == requests + 1
+    assert cache.stats()['misses'] == 2
+    assert json.loads(path.read_text())['value'] == first
+
+
+def test_concurrent_writes_are_counted(tmp_path):
+    cache = FileCache(str(tmp_path), max_entries=1000)
+    entry = CacheEntry({'id': 1}, max_age=60)
+
+    def write(n):
+        for i in range(50):
+            cache.set(f'key{n}-{i}', entry)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache._writes == 400
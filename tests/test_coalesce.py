@@ -0,0 +1,144 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyotify import Spotify, AsyncSpotify
+from pyotify.coalesce import SingleFlight, AsyncSingleFlight, request_key
+from benchmarks.mock_server import MockSpotifyServer
+
+
+def test_request_key_ignores_param_order():
+    assert request_key('GET', 'albums', {'ids': 'a', 'market': 'DE'}) == \
+        request_key('GET', 'albums', {'market': 'DE', 'ids': 'a'})
+
+
+def run_together(flight, key, func, callers=8):
+    '''Calls flight.do(key, func) from callers threads while func is running, returns their results'''
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return func()
+
+    with ThreadPoolExecutor(callers) as executor:
+        leader = executor.submit(flight.do, key, slow)
+        started.wait(5)
+        followers = [executor.submit(flight.do, key, slow) for _ in range(callers - 1)]
+        # The followers are waiting for the leader once they are counted.
+        while flight.coalesced < callers - 1:
+            time.sleep(0.01)
+        release.set()
+        return [future.exception() or future.result() for future in [leader, *followers]]
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+    results = run_together(flight, 'key', lambda: calls.append(1) or {'id': 1})
+    assert len(calls) == 1
+    assert results == [{'id': 1}] * 8
+    assert flight.coalesced == 7
+
+
+def test_concurrent_calls_share_one_error():
+    flight = SingleFlight()
+    error = ValueError('boom')
+
+    def fail():
+        raise error
+
+    assert run_together(flight, 'key', fail) == [error] * 8
+
+
+def test_later_and_other_calls_run_again():
+    flight = SingleFlight()
+    calls = []
+    assert flight.do('a', lambda: calls.append('a') or 1) == 1
+    assert flight.do('a', lambda: calls.append('a') or 2) == 2
+    assert flight.do('b', lambda: calls.append('b') or 3) == 3
+    assert calls == ['a', 'a', 'b']
+    assert flight.coalesced == 0
+
+
+def test_async_concurrent_calls_share_one_result():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'id': 1}
+
+    async def main():
+        return await asyncio.gather(*(flight.do('key', fetch) for _ in range(8)))
+
+    assert asyncio.run(main()) == [{'id': 1}] * 8
+    assert len(calls) == 1
+    assert flight.coalesced == 7
+
+
+def test_async_cancelled_waiter_does_not_cancel_the_call():
+    flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        first = asyncio.ensure_future(flight.do('key', fetch))
+        second = asyncio.ensure_future(flight.do('key', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ('done', True)
+
+
+def test_async_concurrent_calls_share_one_error():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def main():
+        return await asyncio.gather(*(flight.do('key', fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert errors[0] is errors[1] is errors[2]
+
+
+@pytest.fixture(scope='module')
+def slow_server():
+    with MockSpotifyServer(latency=0.2, playlist_size=10) as server:
+        yield server
+
+
+def test_client_coalesces_identical_gets(slow_server):
+    with slow_server.client_class(Spotify)('id', 'secret', coalesce=True) as sp:
+        sp.token_manager.get_token()
+        requests = slow_server.stats()['requests']
+        with ThreadPoolExecutor(8) as executor:
+            playlists = list(executor.map(lambda _: sp.playlist('pl1'), range(8)))
+    assert all(playlist == playlists[0] for playlist in playlists)
+    assert slow_server.stats()['requests'] - requests < 8
+    assert sp.coalescer.coalesced >= 1
+
+
+def test_async_client_coalesces_identical_gets(slow_server):
+    async def main():
+        async with slow_server.client_class(AsyncSpotify)('id', 'secret', coalesce=True) as sp:
+            await sp.playlist('pl1')
+            requests = slow_server.stats()['requests']
+            playlists = await asyncio.gather(*(sp.playlist('pl1') for _ in range(8)))
+            return playlists, slow_server.stats()['requests'] - requests
+
+    playlists, requests = asyncio.run(main())
+    assert all(playlist == playlists[0] for playlist in playlists)
+    assert requests == 1
@@ -0,0 +1,64 @@
+import os
+import json
+import time
+from functools import partial
+
+import pytest
+
+from pyotify import Spotify
+from pyotify.crawl import CrawlExecutor, CrawlError
+
+SIZE = 200
+
+
+def expand(client, ids):
+    '''Crawls the tree of the numbers below SIZE, n has the children 2n + 1 and 2n + 2'''
+    records = [{'id': id} for id in ids]
+    children = [('node', child) for id in ids for child in (2 * id + 1, 2 * id + 2) if child < SIZE]
+    return records, children
+
+
+def expand_or_die(marker, client, ids):
+    # The first worker to see node 40 dies with it, the batch has to be crawled by another one.
+    if 40 in ids and not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return expand(client, ids)
+
+
+def failing_factory():
+    raise RuntimeError('no credentials')
+
+
+def test_crawl_visits_every_node_once(tmp_path):
+    output = tmp_path / 'crawl.ndjson'
+    crawler = CrawlExecutor(partial(Spotify, 'id', 'secret'), {'node': expand}, {'node': 7}, processes=3,
+                            output=str(output))
+    stats = crawler.run([('node', 0)])
+    ids = [json.loads(line)['id'] for line in output.read_text().splitlines()]
+    assert sorted(ids) == list(range(SIZE))
+    assert stats['records'] == SIZE and stats['errors'] == 0
+
+
+def test_crawl_recrawls_batches_of_dead_workers(tmp_path):
+    output = tmp_path / 'crawl.ndjson'
+    handler = partial(expand_or_die, str(tmp_path / 'died'))
+    crawler = CrawlExecutor(partial(Spotify, 'id', 'secret'), {'node': handler}, {'node': 7}, processes=2,
+                            output=str(output))
+    crawler.poll_interval = 0.1
+    crawler.run([('node', 0)])
+    ids = [json.loads(line)['id'] for line in output.read_text().splitlines()]
+    assert os.path.exists(tmp_path / 'died')
+    assert sorted(ids) == list(range(SIZE))
+
+
+def test_crawl_raises_when_every_worker_dies(tmp_path):
+    crawler = CrawlExecutor(failing_factory, {'node': expand}, processes=2, checkpoint=str(tmp_path / 'crawl.json'))
+    crawler.poll_interval = 0.1
+    start = time.monotonic()
+    with pytest.raises(CrawlError):
+        crawler.run([('node', 0)])
+    assert time.monotonic() - start < 10
+    # The unfinished work is checkpointed for a later run.
+    state = json.loads((tmp_path / 'crawl.json').read_text())
+    assert state['frontier']['node'] == [0]
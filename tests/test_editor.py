@@ -0,0 +1,133 @@
+import asyncio
+import random
+
+import pytest
+
+from pyotify import AsyncSpotify, Spotify
+from pyotify.editor import MAX_ITEMS, PlaylistEditor, plan_changes
+
+
+def replay(current, operations):
+    '''Apply operations to current the way the Web API edits a playlist'''
+    items = list(current)
+    for operation in operations:
+        body = operation.body
+        if operation.method == 'DELETE':
+            assert len(body['tracks']) <= MAX_ITEMS
+            removed = set()
+            for track in body['tracks']:
+                if 'positions' not in track:
+                    removed.update(i for i, uri in enumerate(items) if uri == track['uri'])
+                    continue
+                for position in track['positions']:
+                    assert position < len(items) and items[position] == track['uri'], f'bad position {position}'
+                    removed.add(position)
+            items = [uri for i, uri in enumerate(items) if i not in removed]
+        elif operation.method == 'POST':
+            assert len(body['uris']) <= MAX_ITEMS
+            position = body.get('position', len(items))
+            items[position:position] = body['uris']
+        elif 'uris' in body:
+            items = list(body['uris'])
+        else:
+            start, length, before = body['range_start'], body['range_length'], body['insert_before']
+            assert start + length <= len(items) and before <= len(items)
+            moved = items[start:start + length]
+            del items[start:start + length]
+            destination = before if before < start else before - length
+            items[destination:destination] = moved
+    return items
+
+
+@pytest.mark.parametrize('current, target', [
+    (['a'] * 250 + ['b'], ['a'] * 10 + ['b']),
+    ([f't{i % 120}' for i in range(240)], [f't{i}' for i in range(120)]),
+    (['a', 'b', 'c', 'd'], ['d', 'c', 'b', 'a']),
+    (['a', 'b', 'a', 'c'], ['c', 'a', 'x', 'b']),
+    ([], ['a', 'b']),
+    (['a', 'b'], []),
+])
+def test_plan_reaches_target(current, target):
+    assert replay(current, plan_changes(current, target)) == target
+    assert replay(current, plan_changes(current, target, allow_rewrite=True)) == target
+
+
+def test_plan_random_edits():
+    rng = random.Random(0)
+    for _ in range(200):
+        current = [f't{rng.randrange(60)}' for _ in range(rng.randrange(300))]
+        target = [uri for uri in current if rng.random() < 0.7] + [f'n{i}' for i in range(rng.randrange(20))]
+        rng.shuffle(target) if rng.random() < 0.3 else None
+        assert replay(current, plan_changes(current, target)) == target
+
+
+def test_plan_batches_removals_and_moves():
+    current = [f't{i}' for i in range(10)]
+    assert plan_changes(current, current) == []
+    operations = plan_changes(current, current[1:] + current[:1])
+    assert [operation.method for operation in operations] == ['PUT']
+    operations = plan_changes(current + ['x'] * 150, current)
+    assert [operation.method for operation in operations] == ['DELETE']
+
+
+def test_plan_prefers_rewrite_when_shorter():
+    current = [f't{i}' for i in range(50)]
+    target = current[::-1]
+    assert all('uris' not in operation.body for operation in plan_changes(current, target))
+    operations = plan_changes(current, target, allow_rewrite=True)
+    assert [operation.method for operation in operations] == ['PUT']
+    assert operations[0].body == {'uris': target}
+
+
+def test_plan_keeps_unavailable_items():
+    current = [f't{i}' for i in range(50)] + [None, 't50', None]
+    target = [uri for uri in current[::-1] if uri != 't3'] + ['n1']
+    for allow_rewrite in (False, True):
+        operations = plan_changes(current, target, allow_rewrite=allow_rewrite)
+        assert replay(current, operations) == target
+        for operation in operations:
+            assert None not in operation.body.get('uris', [])
+            assert all(track['uri'] is not None for track in operation.body.get('tracks', []))
+    with pytest.raises(ValueError):
+        plan_changes(current, [uri for uri in current if uri is not None])
+
+
+def test_set_keeps_unavailable_items():
+    editor = PlaylistEditor(None, 'p1')
+    editor._current = ['spotify:track:a', None, 'spotify:track:b', None]
+    editor.set(['c', 'a'])
+    assert editor._target(editor._current) == ['spotify:track:c', None, 'spotify:track:a', None]
+
+
+def edit(editor):
+    uris = editor._current
+    return editor.remove(uris[:10]).add(['x1', 'x2'], position=5).move(100, 0, 3)
+
+
+def test_apply(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    editor = PlaylistEditor(client, 'p1')
+    editor.load()
+    assert len(editor._current) == 250 and editor.snapshot_id == 'p1-snapshot'
+    operations = edit(editor).plan()
+    requests = server.stats()['requests']
+    snapshot_id = editor.apply()
+    assert server.stats()['requests'] - requests == len(operations)
+    assert snapshot_id.startswith('snapshot') and snapshot_id == editor.snapshot_id
+    assert editor._current is None and editor._edits == []
+
+
+def test_apply_async(server):
+    async def apply():
+        async with server.client_class(AsyncSpotify)('id', 'secret') as client:
+            editor = PlaylistEditor(client, 'p1')
+            await editor.load()
+            operations = await edit(editor).plan()
+            target = await editor.target()
+            snapshot_id = await editor.apply()
+            return editor, operations, target, snapshot_id
+
+    editor, operations, target, snapshot_id = asyncio.run(apply())
+    assert operations and replay([f'spotify:track:p1i{i}' for i in range(250)], operations) == target
+    assert snapshot_id.startswith('snapshot') and snapshot_id == editor.snapshot_id
+    assert editor._current is None
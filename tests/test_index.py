@@ -0,0 +1,109 @@
+import itertools
+
+import pytest
+
+from pyotify import Spotify
+from pyotify.index import SearchIndex, normalize, parse_query
+
+
+def artist(id, name, genres=()):
+    return {'type': 'artist', 'id': id, 'name': name, 'genres': list(genres)}
+
+
+def track(id, name, artists, album, release_date, isrc):
+    return {'type': 'track', 'id': id, 'name': name, 'artists': artists,
+            'album': {'type': 'album', 'id': f'{id}-album', 'name': album, 'release_date': release_date,
+                      'artists': artists},
+            'external_ids': {'isrc': isrc}}
+
+
+DAFT_PUNK = artist('a1', 'Daft Punk', ['french house'])
+BEYONCE = artist('a2', 'Beyoncé', ['pop', 'r&b'])
+TRACKS = [
+    track('t1', 'One More Time', [DAFT_PUNK], 'Discovery', '2001-03-07', 'GBDUW0000053'),
+    track('t2', 'Around the World', [DAFT_PUNK], 'Homework', '1997-01-20', 'GBDUW9600012'),
+    track('t3', 'Crazy in Love', [BEYONCE], 'Dangerously in Love', '2003-06-23', 'USSM10301768'),
+    track('t4', 'One More Time', [artist('a3', 'Some Cover Band')], 'Covers', '2015-01-01', 'USAAA1500001'),
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_response({'tracks': TRACKS})
+    return index
+
+
+def ids(results):
+    return [obj['id'] for confidence, obj in results]
+
+
+def test_normalize():
+    assert normalize("Beyoncé & Jay-Z's") == ['beyonce', 'and', 'jay', 'zs']
+
+
+def test_parse_query():
+    tokens, filters = parse_query('artist:"daft punk" year:1997-2001 around')
+    assert tokens == ['around']
+    assert filters == {'artist': 'daft punk', 'year': '1997-2001'}
+
+
+def test_indexes_nested_objects(index):
+    assert len(index) == 4 + 4 + 3
+
+
+def test_exact_match_ranks_first(index):
+    results = index.search('one more time daft punk')
+    assert ids(results)[0] == 't1'
+    assert results[0][0] == pytest.approx(1.0)
+
+
+def test_misspelled_tokens_match(index):
+    assert ids(index.search('arond the wrld'))[:1] == ['t2']
+
+
+@pytest.mark.parametrize('q, expected', [
+    ('artist:"daft punk"', {'t1', 't2'}),
+    ('one more time artist:"some cover band"', {'t4'}),
+    ('year:1990-2000', set()),
+    ('daft punk year:1990-2000', {'t2'}),
+    ('isrc:ussm10301768', {'t3'}),
+    ('isrc:XX0000000000', set()),
+    ('genre:pop', set()),
+])
+def test_filters(index, q, expected):
+    assert set(ids(index.search(q, 'track'))) == expected
+
+
+def test_types(index):
+    assert ids(index.search('genre:pop', 'artist')) == ['a2']
+    assert ids(index.search('discovery', 'album')) == ['t1-album']
+    assert set(ids(index.search('daft punk', 'track,artist'))) == {'t1', 't2', 'a1'}
+
+
+def test_unsupported_filters_go_to_the_api(index):
+    assert index.search('tag:new', 'album') is None
+
+
+def test_answer(index):
+    response = index.answer('crazy in love beyonce', 'track')
+    assert [item['id'] for item in response['tracks']['items']][:1] == ['t3']
+    assert index.answer('something else entirely', 'track') is None
+    assert index.stats()['hits'] == 1
+    assert index.stats()['misses'] == 1
+    assert index.answer('crazy in love beyonce', 'track', offset=0) is None
+    assert index.stats()['misses'] == 1
+
+
+def test_only_callers_that_cannot_page_are_answered(server, index):
+    client = server.client_class(Spotify)('id', 'secret', index=index)
+    requests = server.stats()['requests']
+    response = client.search('one more time daft punk', 'track')
+    assert response['tracks']['items'][0]['id'] == 't1'
+    assert server.stats()['requests'] == requests
+
+    page = client.search('one more time daft punk', 'track', offset=0)
+    assert page['tracks']['total'] == 1000 and page['tracks']['next'] is not None
+    items = list(itertools.islice(client.paginate(client.search, 'one more time daft punk', 'track'), 60))
+    assert len(items) == 60 and 't1' not in [item['id'] for item in items]
+    assert server.stats()['requests'] == requests + 3
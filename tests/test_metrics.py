@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from pyotify import AsyncSpotify, Spotify
+from pyotify.metrics import Metrics, template_path
+
+
+def record(metrics, method, path, total, status=200, attempts=1, **values):
+    '''Count one finished call that took total seconds'''
+    request = metrics.start(method, path)
+    request.status, request.attempts, request.total = status, attempts, total
+    for name, value in values.items():
+        setattr(request, name, value)
+    metrics.after_request(request)
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('playlists/abc/tracks', 'playlists/{id}/tracks'),
+    ('me/tracks/contains', 'me/tracks/contains'),
+    ('tracks', 'tracks'),
+    ('audio-analysis/xyz', 'audio-analysis/{id}'),
+    ('users/u1/playlists', 'users/{id}/playlists'),
+])
+def test_template_path(path, endpoint):
+    assert template_path(path) == endpoint
+
+
+def test_counts_per_endpoint():
+    metrics = Metrics(buckets=(0.1, 1))
+    record(metrics, 'GET', 'playlists/a/tracks', 0.05, bytes=100)
+    record(metrics, 'GET', 'playlists/b/tracks', 0.5, attempts=3, bytes=50)
+    record(metrics, 'GET', 'playlists/b/tracks', 2, status=None, error='Timeout')
+    record(metrics, 'POST', 'playlists/b/tracks', 0.01, status=201)
+    record(metrics, 'GET', 'tracks/a', 0.01, cached=True)
+
+    snapshot = metrics.snapshot()
+    assert sorted(snapshot) == ['GET playlists/{id}/tracks', 'GET tracks/{id}', 'POST playlists/{id}/tracks']
+    tracks = snapshot['GET playlists/{id}/tracks']
+    assert (tracks['requests'], tracks['errors'], tracks['retries'], tracks['bytes']) == (3, 1, 2, 150)
+    assert tracks['buckets'] == [1, 2]
+    assert tracks['statuses'] == {200: 2}
+    assert tracks['seconds'] == pytest.approx(2.55)
+    assert snapshot['GET tracks/{id}']['cached'] == 1
+    assert snapshot['POST playlists/{id}/tracks']['statuses'] == {201: 1}
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_percentiles():
+    metrics = Metrics(buckets=(0.01, 0.1, 1))
+    for total in [0.005] * 50 + [0.05] * 40 + [0.5] * 9 + [5]:
+        record(metrics, 'GET', 'tracks', total)
+    assert metrics.percentile('GET tracks', 50) == pytest.approx(0.01)
+    assert metrics.percentile('GET tracks', 25) == pytest.approx(0.005)
+    assert metrics.percentile('GET tracks', 70) == pytest.approx(0.055)
+    assert metrics.percentile('GET tracks', 99) == pytest.approx(1)
+    assert metrics.percentile('GET tracks', 99.9) == 1
+    assert metrics.percentile('GET albums', 50) is None
+
+
+def test_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1))
+    record(metrics, 'GET', 'playlists/a/tracks', 0.05, wait=0.04, decode=0.01)
+    record(metrics, 'GET', 'playlists/a/tracks', 0.5, status=429)
+    lines = metrics.to_prometheus().splitlines()
+    labels = 'method="GET",endpoint="playlists/{id}/tracks"'
+    assert f'pyotify_requests_total{{{labels},status="200"}} 1' in lines
+    assert f'pyotify_requests_total{{{labels},status="429"}} 1' in lines
+    assert f'pyotify_request_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+    assert f'pyotify_request_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f'pyotify_request_seconds_count{{{labels}}} 2' in lines
+    assert f'pyotify_phase_seconds_total{{{labels},phase="decode"}} 0.010000' in lines
+    assert '# TYPE pyotify_request_seconds histogram' in lines
+
+
+def test_after_hook_sees_counted_records(server):
+    records = []
+    metrics = Metrics(after=records.append)
+    client = server.client_class(Spotify)('id', 'secret', instrumentation=metrics)
+    client.bulk_tracks([f'm{i}' for i in range(60)])
+    client.playlist_tracks('p1', limit=10)
+    snapshot = metrics.snapshot()
+    assert snapshot['GET tracks']['requests'] == 2
+    assert snapshot['GET playlists/{id}/tracks']['statuses'] == {200: 1}
+    assert [r.endpoint for r in records].count('tracks') == 2
+    assert all(r.bytes > 0 and r.total >= r.wait for r in records)
+    assert metrics.percentile('GET tracks', 50) > 0
+
+
+def test_async_client_metrics(server):
+    metrics = Metrics()
+
+    async def fetch():
+        async with server.client_class(AsyncSpotify)('id', 'secret', instrumentation=metrics) as client:
+            await asyncio.gather(*(client.artists_top_tracks(f'a{i}', country='US') for i in range(5)))
+
+    asyncio.run(fetch())
+    artists = metrics.snapshot()['GET artists/{id}/top-tracks']
+    assert artists['requests'] == 5 and artists['statuses'] == {200: 5}
+    assert artists['phases']['wait'] > 0
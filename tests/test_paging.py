@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import pyotify.paging as paging
+from pyotify import Spotify, AsyncSpotify
+from pyotify.models import Paging, parse
+from benchmarks.mock_server import MockSpotifyServer
+
+
+def page(**fields):
+    return {'href': None, 'items': [], 'limit': 20, 'offset': 0, 'total': 0, 'next': None, 'previous': None,
+            **fields}
+
+
+@pytest.mark.parametrize('wrap', [dict, Paging], ids=['dict', 'model'])
+def test_remaining_offsets(wrap):
+    assert list(paging.remaining_offsets('saved_tracks', wrap(page(limit=50, total=120)))) == [50, 100]
+    assert list(paging.remaining_offsets('search', wrap(page(limit=50, total=5000))))[-1] == 950
+
+
+@pytest.mark.parametrize('wrap', [dict, Paging], ids=['dict', 'model'])
+def test_next_cursor(wrap):
+    following = wrap(page(total=100, next='https://next', cursors={'after': 'a20'}))
+    assert paging.next_cursor('user_followed_artists', following) == 'a20'
+    assert paging.next_cursor('user_followed_artists', wrap(page(total=100, cursors={'after': None}))) is None
+    assert paging.next_cursor('user_followed_artists', wrap(page(total=100, next='https://next'))) is None
+
+
+def test_next_cursor_of_parsed_envelope():
+    response = parse({'artists': page(total=100, next='https://next', cursors={'after': 'a20'})})
+    assert paging.next_cursor('user_followed_artists', paging.unwrap(response, 'artists')) == 'a20'
+
+
+def test_envelope_key():
+    assert paging.envelope_key('search', ('q', 'track'), {}) == 'tracks'
+    assert paging.envelope_key('user_followed_artists', (), {}) == 'artists'
+    with pytest.raises(ValueError):
+        paging.envelope_key('search', ('q', 'track,album'), {})
+
+
+@pytest.mark.parametrize('models', [False, True], ids=['dicts', 'models'])
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate(server, models, prefetch):
+    sp = server.client_class(Spotify)('id', 'secret', models=models)
+    tracks = list(sp.paginate(sp.playlist_tracks, 'pl1', prefetch=prefetch))
+    artists = list(sp.paginate(sp.user_followed_artists))
+    played = list(sp.paginate(sp.recently_played))
+    assert len(tracks) == 250 and len(artists) == 120 and played
+    assert len({paging.field(artist, 'id') for artist in artists}) == 120
+    sp.close()
+
+
+@pytest.mark.parametrize('models', [False, True], ids=['dicts', 'models'])
+def test_paginate_async(server, models):
+    async def crawl():
+        async with server.client_class(AsyncSpotify)('id', 'secret', models=models) as sp:
+            tracks = [track async for track in sp.paginate(sp.playlist_tracks, 'pl1', prefetch=3)]
+            artists = [artist async for artist in sp.paginate(sp.user_followed_artists)]
+            return tracks, artists
+
+    tracks, artists = asyncio.run(crawl())
+    assert len(tracks) == 250 and len(artists) == 120
+
+
+def test_paginate_async_cancels_prefetch():
+    async def first_tracks():
+        async with slow_server.client_class(AsyncSpotify)('id', 'secret') as sp:
+            pages = sp.paginate(sp.playlist_tracks, 'pl1', prefetch=3)
+            # Past the first page, so the next pages are being fetched.
+            tracks = [await pages.__anext__() for _ in range(101)]
+            await pages.aclose()
+            await asyncio.sleep(0)
+            # asyncio.run() cancels whatever is left, so this has to look before it returns.
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+            return tracks, pending
+
+    with MockSpotifyServer(latency=0.3, playlist_size=500) as slow_server:
+        tracks, pending = asyncio.run(first_tracks())
+    assert len(tracks) == 101
+    assert pending == []
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+import pyotify.utils as utils
+from pyotify import AsyncSpotify
+from pyotify.playback import PlaybackWatcher, _User
+
+
+def playing(track_id='t1', progress_ms=0, duration_ms=200000, is_playing=True, device_id='d1'):
+    return {'item': {'id': track_id, 'duration_ms': duration_ms}, 'progress_ms': progress_ms,
+            'is_playing': is_playing, 'device': {'id': device_id}}
+
+
+def user_with(state):
+    user = _User(None)
+    user.state = state
+    return user
+
+
+@pytest.mark.parametrize('progress_ms, delay', [
+    (0, 30),                  # capped at max_interval
+    (180000, 19.5),           # end_margin before the end
+    (199000, 1),              # never below min_interval
+    (200000, 1),
+])
+def test_polls_just_before_the_track_ends(progress_ms, delay):
+    watcher = PlaybackWatcher(min_interval=1, max_interval=30, end_margin=0.5)
+    assert watcher.next_delay(user_with(playing(progress_ms=progress_ms))) == pytest.approx(delay)
+
+
+def test_idle_polls_back_off():
+    watcher = PlaybackWatcher(idle_interval=5, idle_max_interval=30)
+    user = user_with(playing(is_playing=False))
+    assert [watcher.next_delay(user) for _ in range(5)] == [5, 10, 20, 30, 30]
+    user.state = None
+    assert watcher.next_delay(user) == 30
+    user.state = playing(progress_ms=190000)
+    assert watcher.next_delay(user) == 9.5
+    user.state = None
+    assert watcher.next_delay(user) == 5
+
+
+@pytest.mark.parametrize('previous, state, elapsed, events', [
+    (None, playing(), None, ['track_changed']),
+    (None, None, None, []),
+    (playing(), playing('t2'), 5, ['track_changed']),
+    (playing(), playing(is_playing=False, progress_ms=5000), 5, ['paused']),
+    (playing(is_playing=False), playing(), 5, ['resumed']),
+    (playing(), playing(device_id='d2', progress_ms=5000), 5, ['device_changed']),
+    (playing(progress_ms=10000), playing(progress_ms=15000), 5, []),
+    (playing(progress_ms=10000), playing(progress_ms=60000), 5, ['seek']),
+    (playing(progress_ms=60000), playing(progress_ms=10000), 5, ['seek']),
+    (playing(), None, 5, ['stopped']),
+    (None, None, 5, []),
+])
+def test_detect(previous, state, elapsed, events):
+    assert PlaybackWatcher(seek_tolerance=3).detect(previous, state, elapsed) == events
+
+
+class FakeClient:
+    '''Answers current_playback with the given states in turn'''
+
+    def __init__(self, *states):
+        self.states = list(states)
+
+    async def current_playback(self, market=None):
+        return self.states.pop(0)
+
+
+def test_poll_emits_events():
+    watcher = PlaybackWatcher()
+    events = []
+    watcher.on(None, events.append)
+    client = FakeClient(playing(), playing('t2'), utils.empty_response(None))
+    watcher.watch('alice', client)
+
+    async def poll_all():
+        semaphore = asyncio.Semaphore(1)
+        for _ in range(3):
+            await watcher._poll('alice', watcher._users['alice'], semaphore)
+
+    asyncio.run(poll_all())
+    assert [(event.type, event.key, event.track_id) for event in events] == [
+        ('track_changed', 'alice', 't1'), ('track_changed', 'alice', 't2'), ('stopped', 'alice', None)]
+    assert watcher.state('alice') is None
+    assert watcher.stats() == {'alice': 3}
+
+
+def test_watches_the_mock_server(server):
+    async def watch():
+        async with server.client_class(AsyncSpotify)('id', 'secret') as client:
+            watcher = PlaybackWatcher(min_interval=0.05, max_interval=0.1, idle_interval=0.05)
+            watcher.watch('alice', client)
+            async with watcher:
+                events = watcher.events()
+                first = await asyncio.wait_for(events.__anext__(), 5)
+                server.player.active = False
+                try:
+                    stopped = await asyncio.wait_for(events.__anext__(), 5)
+                finally:
+                    server.player.play()
+                await events.aclose()
+            return first, stopped
+
+    first, stopped = asyncio.run(watch())
+    assert first.type == 'track_changed'
+    assert first.track_id is not None
+    assert stopped.type == 'stopped'
+    assert stopped.previous is not None
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from pyotify.models import Track
+from pyotify.pool import AsyncSpotifyPool, SpotifyPool
+from pyotify.scheduler import RequestScheduler
+
+CREDENTIALS = [('id1', 'secret1'), ('id2', 'secret2'), ('id3', 'secret3')]
+
+
+def test_forwards_client_arguments(server):
+    template = RequestScheduler(rate=1000, max_retries=3, timeout=5)
+    pool = server.client_class(SpotifyPool)(iter(CREDENTIALS), models=True, scheduler=template)
+    assert isinstance(pool.tracks(['t1'])['tracks'][0], Track)
+    schedulers = [lane.scheduler for lane in pool.lanes]
+    assert len({id(scheduler) for scheduler in schedulers + [template]}) == 4
+    for scheduler in schedulers:
+        assert (scheduler.bucket.rate, scheduler.max_retries, scheduler.timeout) == (1000, 3, 5)
+        assert not scheduler.retry_throttled
+
+
+def test_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        SpotifyPool([])
+    with pytest.raises(TypeError):
+        SpotifyPool(CREDENTIALS, token_manager=object())
+
+
+def test_skips_rate_limited_credentials(server):
+    pool = server.client_class(SpotifyPool)(CREDENTIALS)
+    pool.lanes[0].scheduler.pause(60)
+    for i in range(6):
+        pool.tracks([f't{i}'])
+    stats = pool.stats()
+    assert stats['id1']['requests'] == 0
+    assert stats['id2']['requests'] + stats['id3']['requests'] == 6
+
+    # With every credential paused, the one that resumes first is used.
+    pool.lanes[1].scheduler.pause(120)
+    pool.lanes[2].scheduler.pause(0.05)
+    pool.tracks(['t0'])
+    assert pool.stats()['id3']['requests'] == stats['id3']['requests'] + 1
+
+
+def test_prefers_the_least_loaded_credential():
+    pool = SpotifyPool(CREDENTIALS)
+    first, second, third = pool.lanes
+    second.scheduler.throttled = 1
+    assert [pool._acquire_lane() for _ in range(4)] == [first, third, second, first]
+    pool._release_lane(third)
+    assert pool._acquire_lane() is third
+
+
+def test_async_pool(server):
+    async def fetch():
+        async with server.client_class(AsyncSpotifyPool)(CREDENTIALS, models=True, concurrency=4) as pool:
+            pool.lanes[1].scheduler.pause(60)
+            tracks = await asyncio.gather(*(pool.tracks([f't{i}']) for i in range(9)))
+            return tracks, pool.stats(), pool.concurrency
+
+    tracks, stats, concurrency = asyncio.run(fetch())
+    assert all(isinstance(response['tracks'][0], Track) for response in tracks)
+    assert stats['id2']['requests'] == 0
+    assert stats['id1']['requests'] + stats['id3']['requests'] == 9
+    assert concurrency == 4
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+import pytest
+
+from pyotify import AsyncSpotify, Spotify
+from pyotify.recommend import RecommendationEngine, SeedSet, tunable_params
+
+
+class FakeRecommendations(Spotify):
+    '''Answers recommendations from self.answers, keyed on the seeds of the request'''
+
+    def __init__(self, answers=None):
+        super().__init__('id', 'secret')
+        self.answers = answers or {}
+        self.calls = []
+
+    def recommendations(self, limit=None, market=None, seed_artists=None, seed_genres=None, seed_tracks=None,
+                        **kwargs):
+        seeds = (seed_artists, seed_genres, seed_tracks)
+        self.calls.append((seeds, limit, kwargs))
+        if seeds not in self.answers:
+            return {'tracks': []}
+        answer = self.answers[seeds]
+        return answer if answer is None else {'tracks': [{'id': id} if id else None for id in answer]}
+
+    def available_genre_seeds(self):
+        self.calls.append('genres')
+        return {'genres': ['house', 'techno', 'jazz']}
+
+
+def test_windows_interleave_kinds():
+    seeds = SeedSet(artists=['a1', 'a2', 'a3'], genres=['g1', 'g2'], tracks=['t1', 't2', 't3', 't4', 't1'])
+    assert seeds.windows() == [
+        [('artists', 'a1'), ('genres', 'g1'), ('tracks', 't1'), ('artists', 'a2'), ('genres', 'g2')],
+        [('tracks', 't2'), ('artists', 'a3'), ('tracks', 't3'), ('tracks', 't4')],
+    ]
+    assert seeds.windows(genres={'g2'})[0] == [
+        ('artists', 'a1'), ('genres', 'g2'), ('tracks', 't1'), ('artists', 'a2'), ('tracks', 't2')]
+
+
+def test_tunable_params():
+    assert tunable_params(energy=(0.5, None), tempo=120, max_popularity=50) == {
+        'min_energy': 0.5, 'target_tempo': 120, 'max_popularity': 50}
+    with pytest.raises(ValueError):
+        tunable_params(loudnes=3)
+
+
+def test_identical_windows_share_a_request():
+    client = FakeRecommendations()
+    engine = RecommendationEngine(client)
+    results = engine.recommend([
+        SeedSet(artists=['a1', 'a2'], tracks=['t1']),
+        {'tracks': ['t1'], 'artists': ['a2', 'a1']},
+        SeedSet(artists=['a1', 'a2'], tracks=['t1'], energy=0.5),
+        SeedSet(tracks=[f't{i}' for i in range(1, 8)]),
+    ], limit=10)
+    assert len(results) == 4
+    assert engine.requests == len(client.calls) == 4
+    assert all(limit == 20 for _, limit, _ in client.calls)
+    assert sorted(kwargs for _, _, kwargs in client.calls if kwargs) == [{'target_energy': 0.5}]
+
+
+def test_ranking_by_count_then_position():
+    seeds = SeedSet(tracks=[f't{i}' for i in range(10)])
+    client = FakeRecommendations({
+        (None, None, 't0,t1,t2,t3,t4'): ['x', 'y', 't9', 'z', None],
+        (None, None, 't5,t6,t7,t8,t9'): ['z', 'w', 'y'],
+    })
+    ranked, = RecommendationEngine(client, per_call=5).recommend([seeds], limit=4)
+    assert [(r.id, r.count) for r in ranked] == [('z', 2), ('y', 2), ('x', 1), ('w', 1)]
+    assert ranked[0].score == pytest.approx(1 + 1 - 3 / 5)
+
+    everything, = RecommendationEngine(client, exclude_seeds=False).recommend([seeds], limit=10)
+    assert 't9' in [r.id for r in everything]
+
+
+def test_missing_responses_are_skipped():
+    client = FakeRecommendations({(None, None, 't1'): None, (None, None, 't2'): ['x']})
+    first, second = RecommendationEngine(client).recommend([SeedSet(tracks=['t1']), SeedSet(tracks=['t2'])])
+    assert first == [] and [r.id for r in second] == ['x']
+
+
+def test_unknown_genres_are_dropped(caplog):
+    client = FakeRecommendations()
+    engine = RecommendationEngine(client)
+    with caplog.at_level(logging.WARNING, logger='pyotify.recommend'):
+        engine.recommend([SeedSet(genres=['house', 'vaporwave', 'techno']), SeedSet(genres=['jazz'])])
+    assert "['vaporwave']" in caplog.text
+    assert sorted(seeds for seeds, _, _ in client.calls[1:]) == [(None, 'house,techno', None), (None, 'jazz', None)]
+    engine.recommend([SeedSet(genres=['house'])])
+    assert client.calls.count('genres') == 1
+
+
+def test_recommend_async(server):
+    async def recommend():
+        async with server.client_class(AsyncSpotify)('id', 'secret') as client:
+            engine = RecommendationEngine(client)
+            mixes = await engine.recommend([SeedSet(genres=['rock', 'nope'], artists=['a1']),
+                                            SeedSet(tracks=[f't{i}' for i in range(12)], energy=(0.2, 0.8))],
+                                           limit=15)
+            return mixes, engine.requests
+
+    mixes, requests = asyncio.run(recommend())
+    assert requests == 1 + 3
+    assert [len(mix) for mix in mixes] == [15, 15]
+    assert all(r.id.startswith('rec') for mix in mixes for r in mix)
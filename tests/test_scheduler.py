@@ -0,0 +1,110 @@
+import socket
+
+import pytest
+import requests
+
+from pyotify import Spotify
+from pyotify.scheduler import RequestScheduler
+import pyotify.transport as transport
+
+
+def scheduler(**kwargs):
+    return RequestScheduler(backoff_base=0, **kwargs)
+
+
+@pytest.mark.parametrize('status, idempotent, retried', [
+    (None, True, True),
+    (None, False, False),
+    (429, True, True),
+    (429, False, True),
+    (500, True, True),
+    (502, False, False),
+    (503, True, True),
+    (404, True, False),
+])
+def test_retry_decisions(status, idempotent, retried):
+    delay = scheduler().retry_after(0, status, {'Retry-After': '0'}, idempotent)
+    assert (delay is not None) == retried
+
+
+def test_retries_are_limited():
+    tasks = scheduler(max_retries=2)
+    assert tasks.retry_after(1, 503) is not None
+    assert tasks.retry_after(2, 503) is None
+
+
+def test_throttled_requests_pause_the_scheduler():
+    tasks = scheduler(retry_throttled=False)
+    assert tasks.retry_after(0, 429, {'Retry-After': '30'}) is None
+    assert tasks.throttled == 1
+    assert tasks.delay() > 29
+
+
+class FakeTransport:
+    '''Answers every request with status, or raises error'''
+
+    errors = (ConnectionError,)
+
+    def __init__(self, status=200, error=None, sent=True):
+        self.status = status
+        self.error = error
+        self.was_sent = sent
+        self.requests = 0
+
+    def request(self, method, url, headers=None, params=None, timeout=None, record=None, **kwargs):
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+        return transport.Response(self.status, {}, b'', 0, 'HTTP/1.1', None)
+
+    def sent(self, error):
+        return self.was_sent
+
+    def close(self):
+        pass
+
+
+def send(fake, method):
+    client = Spotify('id', 'secret', token_manager=object(), transport=fake)
+    return client._send(scheduler(max_retries=3), method, 'https://api.spotify.com/v1/me', {}, None, {})
+
+
+@pytest.mark.parametrize('method, requests', [('GET', 4), ('PUT', 4), ('DELETE', 4), ('POST', 1)])
+def test_server_errors_are_retried_for_idempotent_methods(method, requests):
+    fake = FakeTransport(502)
+    assert send(fake, method).status_code == 502
+    assert fake.requests == requests
+
+
+def test_throttled_posts_are_retried():
+    fake = FakeTransport(429)
+    send(fake, 'POST')
+    assert fake.requests == 4
+
+
+@pytest.mark.parametrize('sent, requests', [(True, 1), (False, 4)])
+def test_posts_are_retried_only_before_they_were_sent(sent, requests):
+    fake = FakeTransport(error=ConnectionError('reset'), sent=sent)
+    with pytest.raises(ConnectionError):
+        send(fake, 'POST')
+    assert fake.requests == requests
+
+
+def test_requests_transport_tells_connect_errors_apart():
+    http = transport.RequestsTransport()
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+    # Nothing listens on the port any more.
+    with pytest.raises(http.errors) as refused:
+        http.request('POST', f'http://127.0.0.1:{port}/', timeout=1)
+    assert not http.sent(refused.value)
+
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        # The connection is accepted but never answered.
+        with pytest.raises(requests.ReadTimeout) as timeout:
+            http.request('POST', f'http://127.0.0.1:{listener.getsockname()[1]}/', timeout=0.2)
+    assert http.sent(timeout.value)
+    http.close()
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+from pyotify import AsyncSpotify, Spotify
+from pyotify.store import EntityStore
+
+
+def test_put_get_and_expiry(tmp_path):
+    store = EntityStore(str(tmp_path / 'catalog.db'), ttls={'artist': 0.2})
+    store.put_many('track', {'t1': {'id': 't1', 'name': 'One'}, 't2': {'id': 't2'}})
+    store.put('artist', 'a1', {'id': 'a1'})
+    assert store.get_many('track', ['t1', 't3', 't1']) == {'t1': {'id': 't1', 'name': 'One'}}
+    assert store.get('album', 't1') is None
+    assert store.stats() == {'hits': 1, 'misses': 2}
+
+    time.sleep(0.25)
+    assert store.get('artist', 'a1') is None
+    assert store.purge() == 1
+    store.delete('track', ['t2'])
+    assert list(store.get_many('track', ['t1', 't2'])) == ['t1']
+    store.close()
+
+
+def test_counters_are_thread_safe(tmp_path):
+    store = EntityStore(str(tmp_path / 'catalog.db'))
+    store.put_many('track', {f't{i}': {'id': f't{i}'} for i in range(10)})
+
+    def lookup():
+        for _ in range(50):
+            store.get_many('track', [f't{i}' for i in range(20)])
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.stats() == {'hits': 8 * 50 * 10, 'misses': 8 * 50 * 10}
+
+
+def test_bulk_lookups_fill_the_store(server, tmp_path):
+    store = EntityStore(str(tmp_path / 'catalog.db'))
+    client = server.client_class(Spotify)('id', 'secret', store=store)
+    ids = [f's{i}' for i in range(60)]
+    requests = server.stats()['requests']
+    assert [track['id'] for track in client.bulk_tracks(ids[:30])] == ids[:30]
+    assert server.stats()['requests'] - requests == 1
+    assert [track['id'] for track in client.bulk_tracks(ids + ids[:5])] == ids + ids[:5]
+    assert server.stats()['requests'] - requests == 2
+    assert client.bulk_tracks(ids[:10])[0] == store.get('track', 's0')
+    assert server.stats()['requests'] - requests == 2
+
+
+class ThreadRecordingStore(EntityStore):
+    '''Records the thread each lookup and write runs in'''
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = []
+
+    def get_many(self, type, ids):
+        self.threads.append(threading.get_ident())
+        return super().get_many(type, ids)
+
+    def put_many(self, type, objects):
+        self.threads.append(threading.get_ident())
+        return super().put_many(type, objects)
+
+
+def test_async_client_keeps_sqlite_off_the_event_loop(server, tmp_path):
+    store = ThreadRecordingStore(str(tmp_path / 'catalog.db'))
+    ids = [f'x{i}' for i in range(70)]
+
+    async def fetch():
+        async with server.client_class(AsyncSpotify)('id', 'secret', store=store) as client:
+            first = await client.bulk_artists(ids)
+            second = await client.bulk_artists(ids[::-1])
+            return first, second, threading.get_ident()
+
+    first, second, loop_thread = asyncio.run(fetch())
+    assert [artist['id'] for artist in first] == ids
+    assert [artist['id'] for artist in second] == ids[::-1]
+    assert len(store.threads) == 4 and loop_thread not in store.threads
+    assert store.stats() == {'hits': 70, 'misses': 70}
@@ -0,0 +1,96 @@
+from pyotify import Spotify
+from pyotify.sync import Sync
+
+
+def saved(id, added_at):
+    return {'added_at': added_at, 'track': {'id': id, 'uri': f'spotify:track:{id}'}}
+
+
+class FakeLibrary(Spotify):
+    '''Serves the saved tracks in self.library, newest first, and counts the requests'''
+
+    def __init__(self, library):
+        super().__init__('id', 'secret')
+        self.library = library
+        self.pages = []
+        self.lookups = []
+
+    def saved_tracks(self, limit=None, offset=None, market=None):
+        offset = offset or 0
+        self.pages.append(offset)
+        return {'items': self.library[offset:offset + limit], 'total': len(self.library), 'limit': limit,
+                'offset': offset}
+
+    def bulk_saved_tracks_contains(self, ids):
+        self.lookups.append(list(ids))
+        saved_ids = {item['track']['id'] for item in self.library}
+        return [id in saved_ids for id in ids]
+
+
+def library(count, start=0):
+    return [saved(f't{i}', f'2021-01-01T00:{59 - i // 60:02d}:{59 - i % 60:02d}Z') for i in range(start, count)]
+
+
+def test_first_sync_reports_everything():
+    client = FakeLibrary(library(120))
+    diff = Sync(client, prefetch=2).sync_saved_tracks()
+    assert [item['track']['id'] for item in diff.added] == [f't{i}' for i in range(120)]
+    assert sorted(client.pages) == [0, 50, 100]
+    assert client.lookups == []
+
+
+def test_unchanged_library_costs_one_request():
+    client = FakeLibrary(library(120))
+    sync = Sync(client)
+    sync.sync_saved_tracks()
+    client.pages = []
+    diff = sync.sync_saved_tracks()
+    assert not diff.changed
+    assert client.pages == [0] and client.lookups == []
+
+
+def test_items_added_in_the_same_second():
+    client = FakeLibrary(library(10))
+    sync = Sync(client)
+    sync.sync_saved_tracks()
+    newest = client.library[0]['added_at']
+    client.library[1:1] = [saved('same1', newest)]
+    client.library.insert(0, saved('same2', newest))
+    diff = sync.sync_saved_tracks()
+    assert [item['track']['id'] for item in diff.added] == ['same2', 'same1']
+    assert not sync.sync_saved_tracks().changed
+
+
+def test_removals_are_looked_up_only_when_the_total_is_off():
+    client = FakeLibrary(library(60))
+    sync = Sync(client)
+    sync.sync_saved_tracks()
+    del client.library[30]
+    client.library.insert(0, saved('new', '2022-01-01T00:00:00Z'))
+    diff = sync.sync_saved_tracks()
+    assert [item['track']['id'] for item in diff.added] == ['new']
+    assert diff.removed == ['t30']
+    assert len(client.lookups) == 1
+
+    client.lookups = []
+    client.library.insert(0, saved('newer', '2022-01-02T00:00:00Z'))
+    diff = sync.sync_saved_tracks()
+    assert diff.removed == [] and client.lookups == []
+
+
+def test_saved_albums_against_the_mock_server(server):
+    sync = Sync(server.client_class(Spotify)('id', 'secret'))
+    assert len(sync.sync_saved_albums().added) == 120
+    requests = server.stats()['requests']
+    assert not sync.sync_saved_albums().changed
+    assert server.stats()['requests'] - requests == 1
+
+
+def test_sync_playlist(server):
+    client = server.client_class(Spotify)('id', 'secret')
+    sync = Sync(client)
+    diff = sync.sync_playlist('p2')
+    assert diff.changed and len(diff.added) == 250 and diff.snapshot_id == 'p2-snapshot'
+    requests = server.stats()['requests']
+    assert not sync.sync_playlist('p2').changed
+    assert server.stats()['requests'] - requests == 1
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+import pyotify.transport as transport
+from pyotify import AsyncSpotify, Spotify
+
+HEADERS = {'Authorization': 'Bearer test'}
+
+
+def run(result):
+    '''Result of a transport call, awaited for the asyncio transports'''
+    if asyncio.iscoroutine(result):
+        return asyncio.get_event_loop().run_until_complete(result)
+    return result
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+@pytest.fixture(params=['HTTPXTransport', 'AsyncHTTPXTransport', 'AiohttpTransport'])
+def http(request, loop):
+    if request.param != 'AiohttpTransport':
+        pytest.importorskip('httpx')
+    else:
+        pytest.importorskip('aiohttp')
+    http = getattr(transport, request.param)(max_connections=4)
+    yield http
+    run(http.close())
+
+
+def test_maps_status_headers_and_body(server, http):
+    response = run(http.request('GET', f'{server.api_prefix}tracks', HEADERS, {'ids': 't1,t2'}, 5))
+    assert response.status_code == 200
+    assert response.http_version == 'HTTP/1.1'
+    assert response.headers['content-type'] == 'application/json; charset=utf-8'
+    assert response.headers['ETag'].startswith('"')
+    assert [track['id'] for track in json.loads(response.content)['tracks']] == ['t1', 't2']
+    assert response.elapsed >= 0
+    response.raise_for_status()
+
+
+def test_maps_errors_and_empty_bodies(server, http):
+    missing = run(http.request('GET', f'{server.api_prefix}nothing/here', HEADERS, None, 5))
+    assert missing.status_code == 404
+    assert json.loads(missing.content)['error']['status'] == 404
+    with pytest.raises(Exception) as error:
+        missing.raise_for_status()
+    assert transport.error_status(error.value) == 404
+
+    unauthorized = run(http.request('GET', f'{server.api_prefix}tracks', None, {'ids': 't1'}, 5))
+    assert unauthorized.status_code == 401
+
+    paused = run(http.request('PUT', f'{server.api_prefix}me/player/pause', HEADERS, None, 5))
+    assert (paused.status_code, paused.content) == (204, b'')
+    server.player.play()
+
+
+def test_sends_encoded_bodies(server, http):
+    body = json.dumps({'uris': ['spotify:track:t1']})
+    response = run(http.request('POST', f'{server.api_prefix}playlists/p1/tracks', HEADERS, None, 5, data=body))
+    assert response.status_code == 201
+    assert json.loads(response.content)['snapshot_id'].startswith('snapshot')
+
+
+def test_close_and_connect_errors(server, http):
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+    # Nothing listens on the port any more.
+    with pytest.raises(http.errors) as refused:
+        run(http.request('GET', f'http://127.0.0.1:{port}/', None, None, 1))
+    assert not http.sent(refused.value)
+
+    run(http.close())
+    if isinstance(http, transport.AiohttpTransport):
+        # The session is created again on the next request.
+        assert http.session is None
+        response = run(http.request('GET', f'{server.api_prefix}tracks', HEADERS, {'ids': 't1'}, 5))
+        assert response.status_code == 200
+    else:
+        assert http.client.is_closed
+
+
+def test_requests_transport(server):
+    http = transport.RequestsTransport(keepalive_timeout=0)
+    response = http.request('GET', f'{server.api_prefix}tracks', HEADERS, {'ids': 't1'}, 5)
+    assert (response.status_code, response.http_version) == (200, 'HTTP/1.1')
+    assert json.loads(response.content)['tracks'][0]['id'] == 't1'
+    assert http.session.headers['Connection'] == 'close'
+    http.close()
+    assert not http.session.adapters['http://'].poolmanager.pools
+
+
+@pytest.mark.parametrize('compression, encoding', [(True, 'gzip'), (False, 'identity')])
+def test_accept_encoding(compression, encoding):
+    assert transport.accept_encoding(compression).startswith(encoding)
+
+
+def test_clients_use_other_transports(server):
+    httpx = pytest.importorskip('httpx')
+    http = transport.HTTPXTransport()
+    with server.client_class(Spotify)('id', 'secret', transport=http) as sp:
+        assert sp.tracks(['t1'])['tracks'][0]['id'] == 't1'
+        with pytest.raises(httpx.HTTPStatusError):
+            sp._get('nothing/here')
+    assert http.client.is_closed
+
+    async def fetch():
+        async with server.client_class(AsyncSpotify)('id', 'secret', transport=async_http) as asp:
+            return await asp.tracks(['t2'])
+
+    async_http = transport.AsyncHTTPXTransport()
+    assert asyncio.run(fetch())['tracks'][0]['id'] == 't2'
+    assert async_http.client.is_closed